@@ -2,6 +2,8 @@ import os
 import pandas as pd
 from collections import defaultdict
 
+import circuitops_helper as coh
+
 
 class CircuitOpsDir:
     def __init__(self, orfs_flow_path, design_name, tech_name, odb_path=""):
@@ -363,3 +365,11 @@ class CircuitOpsTables:
         IR_tables["cell_cell_edge"] = self.cell_cell_edge
 
         return IR_tables
+
+    def write_IR_tables(self, output_dir, compression=None):
+        # <table>.csv, or .csv.gz / .csv.zst with compression "gzip" / "zstd"
+        os.makedirs(output_dir, exist_ok=True)
+        return [
+            coh.write_table(df, output_dir, name + ".csv", compression)
+            for name, df in self.get_IR_tables().items()
+        ]
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+
+### pin_pin arcs with cell arcs stored once per libcell:
+### - template: (input pin, output pin) local pin index pairs per libcell
+### - instance: pin ids in libcell pin order, offset into the arc arrays
+### - per arc: delay and whether the instance has the arc
+### net arcs (and cell arcs not within one cell) have no shared structure and
+### are kept as id arrays
+class PinArcStore:
+    def __init__(self, pin_pin_df, pin_df, cell_df):
+        self.N_pin = len(pin_df)
+        is_net = pin_pin_df["is_net"].to_numpy() != 0
+        src = pin_pin_df["src_id"].to_numpy(dtype=np.int64)
+        tar = pin_pin_df["tar_id"].to_numpy(dtype=np.int64)
+        delay = pin_pin_df["arc_delay"].to_numpy(dtype=float)
+
+        # Net arcs
+        self.net_src = src[is_net]
+        self.net_tar = tar[is_net]
+        self.net_delay = delay[is_net]
+
+        # Instances and libcells of the cell arcs; instances are keyed by the
+        # owning cell name, as cell_id of macro pins and ports is the pin id
+        src, tar, delay = src[~is_net], tar[~is_net], delay[~is_net]
+        pin_inst_code, inst_names = pd.factorize(pin_df["cellname"].to_numpy())
+        same = (pin_inst_code[src] >= 0) & (pin_inst_code[src] == pin_inst_code[tar])
+        # arcs between pins of no or different cells have no template and are
+        # kept as id arrays
+        self.other_src = src[~same]
+        self.other_tar = tar[~same]
+        self.other_delay = delay[~same]
+        src, tar, delay = src[same], tar[same], delay[same]
+        inst_code, inst_uniq = pd.factorize(pin_inst_code[src])
+        cells = cell_df.set_index("name")
+        self.inst_cell = (
+            cells["id"]
+            .reindex(np.asarray(inst_names, dtype=object)[inst_uniq])
+            .fillna(-1)
+            .to_numpy(dtype=np.int64)
+        )
+        ref = (
+            cells["ref"]
+            .reindex(np.asarray(inst_names, dtype=object)[inst_uniq])
+            .fillna("")
+            .to_numpy()
+        )
+        self.inst_lib, self.lib_names = pd.factorize(ref)
+        self.lib_names = np.asarray(self.lib_names, dtype=object)
+
+        # Local pin index = rank of the pin name within its libcell
+        pins = np.unique(np.concatenate([src, tar]))
+        self.pin_inst = np.full(self.N_pin, -1, dtype=np.int64)
+        self.pin_inst[src] = inst_code
+        self.pin_inst[tar] = inst_code
+        pin_name = pin_df["name"].to_numpy()[pins]
+        cell_name = pin_df["cellname"].to_numpy()[pins]
+        local_name = np.array(
+            [p[len(c) + 1 :] for p, c in zip(pin_name, cell_name)], dtype=object
+        )
+        lib_pin = pd.DataFrame(
+            {"lib": self.inst_lib[self.pin_inst[pins]], "name": local_name}
+        )
+        lib_pin_uniq = lib_pin.drop_duplicates().sort_values(["lib", "name"])
+        self.lib_pin_ptr = np.zeros(len(self.lib_names) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(lib_pin_uniq["lib"], minlength=len(self.lib_names)),
+            out=self.lib_pin_ptr[1:],
+        )
+        self.lib_pin_names = lib_pin_uniq["name"].to_numpy()
+        local = (
+            pd.MultiIndex.from_frame(lib_pin_uniq).get_indexer(
+                pd.MultiIndex.from_frame(lib_pin)
+            )
+            - self.lib_pin_ptr[lib_pin["lib"].to_numpy()]
+        )
+        self.pin_local = np.full(self.N_pin, -1, dtype=np.int32)
+        self.pin_local[pins] = local
+        self.n_local = max(int(np.diff(self.lib_pin_ptr).max(initial=0)), 1)
+
+        # Instance pin table, in libcell pin order
+        inst_n_pin = np.diff(self.lib_pin_ptr)[self.inst_lib]
+        self.inst_pin_ptr = np.zeros(len(self.inst_cell) + 1, dtype=np.int64)
+        np.cumsum(inst_n_pin, out=self.inst_pin_ptr[1:])
+        self.inst_pins = np.full(self.inst_pin_ptr[-1], -1, dtype=np.int64)
+        self.inst_pins[
+            self.inst_pin_ptr[self.pin_inst[pins]] + self.pin_local[pins]
+        ] = pins
+
+        # Arc templates per libcell
+        key = self._tmpl_key(src, tar)
+        self.tmpl_key = np.unique(key)
+        tmpl_lib = self.tmpl_key // (self.n_local * self.n_local)
+        self.tmpl_ptr = np.zeros(len(self.lib_names) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(tmpl_lib, minlength=len(self.lib_names)),
+            out=self.tmpl_ptr[1:],
+        )
+        self.tmpl_src = ((self.tmpl_key // self.n_local) % self.n_local).astype(
+            np.int32
+        )
+        self.tmpl_tar = (self.tmpl_key % self.n_local).astype(np.int32)
+
+        # Per-arc arrays, instance by instance
+        inst_n_arc = np.diff(self.tmpl_ptr)[self.inst_lib]
+        self.inst_arc_ptr = np.zeros(len(self.inst_cell) + 1, dtype=np.int64)
+        np.cumsum(inst_n_arc, out=self.inst_arc_ptr[1:])
+        self.delay = np.full(self.inst_arc_ptr[-1], np.nan)
+        self.present = np.zeros(self.inst_arc_ptr[-1], dtype=bool)
+        # the templates come from these arcs, so every arc has a slot
+        slot = self.arc_slots(src, tar)
+        self.delay[slot] = delay
+        self.present[slot] = True
+
+    def _tmpl_key(self, src, tar):
+        lib = self.inst_lib[self.pin_inst[src]]
+        return (
+            lib.astype(np.int64) * self.n_local + self.pin_local[src]
+        ) * self.n_local + self.pin_local[tar]
+
+    def arc_slots(self, src, tar):
+        # position of cell arcs (src pin id -> tar pin id) in the arc arrays,
+        # -1 if the pins are not in the same instance or the libcell has no
+        # such arc
+        src = np.asarray(src, dtype=np.int64)
+        tar = np.asarray(tar, dtype=np.int64)
+        inst = self.pin_inst[src]
+        ok = (inst >= 0) & (inst == self.pin_inst[tar])
+        if len(self.tmpl_key) == 0:
+            ok[:] = False
+        key = self._tmpl_key(src[ok], tar[ok])
+        t = np.searchsorted(self.tmpl_key, key).clip(0, max(len(self.tmpl_key) - 1, 0))
+        found = self.tmpl_key[t] == key if len(key) else np.zeros(0, bool)
+        lib = self.inst_lib[inst[ok]]
+        slot = np.full(len(src), -1, dtype=np.int64)
+        slot[np.flatnonzero(ok)[found]] = (
+            self.inst_arc_ptr[inst[ok]] + t - self.tmpl_ptr[lib]
+        )[found]
+        return slot
+
+    @property
+    def num_cell_arcs(self):
+        return int(self.present.sum()) + len(self.other_src)
+
+    def cell_arcs(self):
+        # materialized (src, tar, delay) of the cell arcs
+        n_arc = np.diff(self.inst_arc_ptr)
+        inst = np.repeat(np.arange(len(self.inst_cell)), n_arc)
+        t = np.repeat(self.tmpl_ptr[self.inst_lib], n_arc) + (
+            np.arange(len(inst)) - np.repeat(self.inst_arc_ptr[:-1], n_arc)
+        )
+        src = self.inst_pins[self.inst_pin_ptr[inst] + self.tmpl_src[t]]
+        tar = self.inst_pins[self.inst_pin_ptr[inst] + self.tmpl_tar[t]]
+        return (
+            np.concatenate([src[self.present], self.other_src]),
+            np.concatenate([tar[self.present], self.other_tar]),
+            np.concatenate([self.delay[self.present], self.other_delay]),
+        )
+
+    def to_csr(self, reverse=False, include_net=True):
+        # pin-pin CSR over pin ids: indptr, indices, arc delay
+        src, tar, delay = self.cell_arcs()
+        if include_net:
+            src = np.concatenate([src, self.net_src])
+            tar = np.concatenate([tar, self.net_tar])
+            delay = np.concatenate([delay, self.net_delay])
+        if reverse:
+            src, tar = tar, src
+
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(self.N_pin + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.N_pin), out=indptr[1:])
+        return indptr, tar[order], delay[order]
+
+    def nbytes(self):
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
@@ -0,0 +1,196 @@
+import argparse
+import contextlib
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+import circuitops_helper as coh
+from circuitops_manager import CircuitOpsManager
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+IR_TABLES = [
+    "pin_properties.csv",
+    "cell_properties.csv",
+    "net_properties.csv",
+    "libcell_properties.csv",
+    "pin_pin_edge.csv",
+    "cell_pin_edge.csv",
+    "net_pin_edge.csv",
+    "cell_net_edge.csv",
+    "cell_cell_edge.csv",
+]
+
+
+### IR directories under ir_root (e.g. output/IRs/), as paths relative to it
+### such as "asap7/gcd", largest designs first; tables may be sharded
+def discover_designs(ir_root):
+    designs = []
+    for root, _, _ in os.walk(ir_root):
+        tables = [coh.find_table(root, t) for t in IR_TABLES]
+        if all(tables):
+            size = sum(os.path.getsize(p) for p in tables[0])
+            designs.append((size, os.path.relpath(root, ir_root)))
+    return [d for _, d in sorted(designs, key=lambda x: (-x[0], x[1]))]
+
+
+### tables (see coh.load_tables_OpenROAD) -> manager
+def build_manager(data_root):
+    (
+        pin_df,
+        cell_df,
+        net_df,
+        pin_pin_df,
+        cell_pin_df,
+        net_pin_df,
+        net_cell_df,
+        cell_cell_df,
+        edge_df,
+        fo4_df,
+    ) = coh.load_tables_OpenROAD(os.path.join(data_root, ""))
+    com = CircuitOpsManager(pin_df, cell_df, net_df, edge_df, fo4_df)
+    return com, pin_pin_df
+
+
+### full pipeline of one design, features written to out_dir
+def run_design(data_root, out_dir, cell_cnt_th=200):
+    t0 = time.time()
+    com, pin_pin_df = build_manager(data_root)
+    t_build = time.time() - t0
+
+    selected_pin_df = com.get_selected_pins(cell_cnt_th)
+    driver_pin_info, sink_pin_info = com.get_driver_sink_info_fast(
+        pin_pin_df, selected_pin_df
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    driver_pin_info.to_csv(os.path.join(out_dir, "driver_pin_info.csv"), index=False)
+    sink_pin_info.to_csv(os.path.join(out_dir, "sink_pin_info.csv"), index=False)
+
+    return {
+        "num_pins": com.N_pin,
+        "num_cells": com.N_cell,
+        "num_nets": com.N_net,
+        "num_edges": len(com.edge_df),
+        "num_selected_pins": len(selected_pin_df),
+        "num_sinks": len(sink_pin_info),
+        "build_time": t_build,
+    }
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_worker(task):
+    design, data_root, out_dir, mem_limit_gb, cell_cnt_th = task
+    row = {"design": design, "status": "ok", "error": ""}
+    t0 = time.time()
+    os.makedirs(out_dir, exist_ok=True)
+    # every worker process handles one design, so the limit and the peak RSS
+    # are per design
+    if mem_limit_gb and resource is not None:
+        limit = int(mem_limit_gb * (1 << 30))
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    with open(os.path.join(out_dir, "run.log"), "w") as log:
+        with contextlib.redirect_stdout(log):
+            try:
+                row.update(run_design(data_root, out_dir, cell_cnt_th))
+            except MemoryError:
+                row["status"], row["error"] = "out_of_memory", "MemoryError"
+                traceback.print_exc(file=log)
+            except Exception as e:
+                row["status"], row["error"] = "failed", f"{type(e).__name__}: {e}"
+                traceback.print_exc(file=log)
+    row["time"] = time.time() - t0
+    row["peak_rss_mb"] = _peak_rss_mb()
+    return row
+
+
+### run every design under ir_root in worker processes, one summary row per
+### design
+def run_batch(ir_root, out_root, num_workers=None, mem_limit_gb=None, cell_cnt_th=200):
+    designs = discover_designs(ir_root)
+    if not designs:
+        raise ValueError(f"No IR directories found under {ir_root}")
+    num_workers = min(num_workers or os.cpu_count() or 1, len(designs))
+    print(f"Designs: {len(designs)}, workers: {num_workers}")
+
+    tasks = [
+        (
+            d,
+            os.path.join(ir_root, d),
+            os.path.join(out_root, d),
+            mem_limit_gb,
+            cell_cnt_th,
+        )
+        for d in designs
+    ]
+    # one single-worker executor (process) per design, at most num_workers at
+    # a time: a worker killed by the OOM killer or a hard abort only breaks
+    # the executor of its own design, which is recorded as failed
+    rows, running = [], {}
+    while tasks or running:
+        while tasks and len(running) < num_workers:
+            task = tasks.pop(0)
+            executor = ProcessPoolExecutor(1)
+            running[executor.submit(_run_worker, task)] = (task, executor, time.time())
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            task, executor, t0 = running.pop(future)
+            try:
+                row = future.result()
+            except BrokenProcessPool:
+                row = {
+                    "design": task[0],
+                    "status": "failed",
+                    "error": "BrokenProcessPool: worker process died",
+                    "time": time.time() - t0,
+                    "peak_rss_mb": float("nan"),
+                }
+            executor.shutdown()
+            print(f"{row['design']}: {row['status']} ({row['time']:.1f}s)")
+            rows.append(row)
+
+    summary = pd.DataFrame(rows).sort_values("design", ignore_index=True)
+    os.makedirs(out_root, exist_ok=True)
+    summary.to_csv(os.path.join(out_root, "summary.csv"), index=False)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the CircuitOps pipeline on every design IR directory"
+    )
+    parser.add_argument("ir_root", help="e.g. output/IRs or output/IRs/asap7")
+    parser.add_argument("out_root")
+    parser.add_argument("-j", "--num-workers", type=int, default=None)
+    parser.add_argument(
+        "--mem-limit-gb", type=float, default=None, help="address space per design"
+    )
+    parser.add_argument("--cell-cnt-th", type=int, default=200)
+    args = parser.parse_args()
+
+    summary = run_batch(
+        args.ir_root,
+        args.out_root,
+        num_workers=args.num_workers,
+        mem_limit_gb=args.mem_limit_gb,
+        cell_cnt_th=args.cell_cnt_th,
+    )
+    print(summary.to_string(index=False))
+    if (summary["status"] != "ok").any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
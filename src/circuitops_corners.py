@@ -0,0 +1,104 @@
+import numpy as np
+
+PIN_CORNER_COLS = ["slack", "risearr", "fallarr", "tran"]
+CELL_CORNER_COLS = ["staticpower", "dynamicpower"]
+
+
+### corner-dependent values over one shared topology: every column is one
+### (n_corner, n) array, row c holds corner c in pin id / cell / arc order
+class CornerStack:
+    def __init__(self, N_pin, N_cell, arc_src, arc_tar, arc_is_net):
+        self.N_pin = N_pin
+        self.N_cell = N_cell
+        self.arc_src = np.asarray(arc_src, dtype=np.int64)
+        self.arc_tar = np.asarray(arc_tar, dtype=np.int64)
+        self.arc_is_net = np.asarray(arc_is_net) != 0
+        arc_key = self.arc_src * N_pin + self.arc_tar
+        self.arc_order = np.argsort(arc_key, kind="stable")
+        self.arc_key = arc_key[self.arc_order]
+
+        self.names = []
+        self.pin = {c: np.zeros((0, N_pin)) for c in PIN_CORNER_COLS}
+        self.cell = {c: np.zeros((0, N_cell)) for c in CELL_CORNER_COLS}
+        self.arc_delay = np.zeros((0, len(self.arc_src)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def corner_idx(self, name):
+        if name not in self.names:
+            raise ValueError(f"Unknown corner: {name}")
+        return self.names.index(name)
+
+    def arc_slots(self, src, tar):
+        # position of arcs (src pin id -> tar pin id) in the arc order, -1 if
+        # the arc is not in the shared topology
+        key = np.asarray(src, dtype=np.int64) * self.N_pin + np.asarray(
+            tar, dtype=np.int64
+        )
+        if len(self.arc_key) == 0:
+            return np.full(len(key), -1, dtype=np.int64)
+        pos = np.searchsorted(self.arc_key, key).clip(0, len(self.arc_key) - 1)
+        return np.where(self.arc_key[pos] == key, self.arc_order[pos], -1)
+
+    def add(self, name, pin_values, cell_values, arc_delay):
+        # values already aligned to pin ids / cell rows / arcs, NaN if missing
+        if name in self.names:
+            raise ValueError(f"Corner already exists: {name}")
+        self.names.append(name)
+        for c in PIN_CORNER_COLS:
+            self.pin[c] = np.vstack([self.pin[c], pin_values[c]])
+        for c in CELL_CORNER_COLS:
+            self.cell[c] = np.vstack([self.cell[c], cell_values[c]])
+        self.arc_delay = np.vstack([self.arc_delay, arc_delay])
+
+    def update(self, corner, col, idx, values):
+        # values of one corner at pin ids / cell rows / arc positions idx;
+        # read-only stacks (loaded or attached) are copied first
+        stack = self.values(col)
+        if not stack.flags.writeable:
+            stack = stack.copy()
+            if col == "arc_delay":
+                self.arc_delay = stack
+            elif col in self.pin:
+                self.pin[col] = stack
+            else:
+                self.cell[col] = stack
+        stack[corner, idx] = values
+
+    def values(self, col):
+        if col == "arc_delay":
+            return self.arc_delay
+        if col in self.pin:
+            return self.pin[col]
+        if col in self.cell:
+            return self.cell[col]
+        raise ValueError(f"Unsupported corner column: {col}")
+
+    def reduce(self, col, how="min"):
+        # worst value across corners and the corner it comes from (-1 if the
+        # value is missing in all corners)
+        if how not in ("min", "max"):
+            raise ValueError("how must be 'min' or 'max'")
+        v = self.values(col)
+        missing = np.isnan(v).all(axis=0)
+        if len(v) == 0:
+            return np.full(v.shape[1], np.nan), np.full(v.shape[1], -1)
+        filled = np.where(np.isnan(v), np.inf if how == "min" else -np.inf, v)
+        corner = filled.argmin(axis=0) if how == "min" else filled.argmax(axis=0)
+        out = filled[corner, np.arange(v.shape[1])]
+        return np.where(missing, np.nan, out), np.where(missing, -1, corner)
+
+    def arc_max_by_tar(self, net):
+        # per-corner max delay of the net (or cell) arcs into every pin:
+        # (n_corner, N_pin), NaN for pins without such arcs
+        sel = np.flatnonzero(self.arc_is_net == net)
+        out = np.full((len(self), self.N_pin), np.nan)
+        if len(sel) == 0 or len(self) == 0:
+            return out
+        order = sel[np.argsort(self.arc_tar[sel], kind="stable")]
+        tar = self.arc_tar[order]
+        start = np.flatnonzero(np.r_[True, tar[1:] != tar[:-1]])
+        d = self.arc_delay[:, order]
+        out[:, tar[start]] = np.fmax.reduceat(d, start, axis=1)
+        return out
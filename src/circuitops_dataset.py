@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DATASET_FORMAT = "circuitops-dataset"
+DATASET_VERSION = 1
+SPLITS = ["train", "test"]
+
+# stage delay model of the example notebook
+STAGE_DELAY_FEATURES = [
+    "x",
+    "y",
+    "cap",
+    "cap_sum",
+    "driver_fo4_delay",
+    "driver_fix_load_delay",
+    "context_x_mean",
+    "context_x_min",
+    "context_x_max",
+    "context_x_std",
+    "context_y_mean",
+    "context_y_min",
+    "context_y_max",
+    "context_y_std",
+]
+STAGE_DELAY_LABELS = ["stage_delay"]
+
+
+### count / mean / M2 / min / max / sum of squares per column, merged batch by
+### batch (Chan et al.), so statistics of any number of rows fit in memory;
+### non-finite values (NaN, inf) are skipped, so every column has its own count
+class RunningStats:
+    def __init__(self, n_col):
+        self.rows = 0
+        self.count = np.zeros(n_col, dtype=np.int64)
+        self.mean = np.zeros(n_col)
+        self.m2 = np.zeros(n_col)
+        self.min = np.full(n_col, np.inf)
+        self.max = np.full(n_col, -np.inf)
+        self.sumsq = np.zeros(n_col)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        if not len(x):
+            return
+        ok = np.isfinite(x)
+        n = ok.sum(axis=0)
+        x0 = np.where(ok, x, 0.0)
+        mean = np.divide(x0.sum(axis=0), n, out=np.zeros(len(n)), where=n > 0)
+        m2 = (np.where(ok, x - mean, 0.0) ** 2).sum(axis=0)
+        total = self.count + n
+        w = np.divide(n, total, out=np.zeros(len(n)), where=total > 0)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * w
+        self.m2 = self.m2 + m2 + delta**2 * self.count * w
+        self.count = total
+        self.rows += len(x)
+        self.min = np.minimum(self.min, np.where(ok, x, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(ok, x, -np.inf).max(axis=0))
+        self.sumsq = self.sumsq + (x0**2).sum(axis=0)
+
+    def to_dict(self):
+        std = np.sqrt(
+            np.divide(
+                self.m2, self.count, out=np.zeros(len(self.m2)), where=self.count > 0
+            )
+        )
+        return {
+            "rows": self.rows,
+            "count": self.count.tolist(),
+            "mean": self.mean.tolist(),
+            "std": std.tolist(),
+            "min": self.min.tolist(),
+            "max": self.max.tolist(),
+            "l2": np.sqrt(self.sumsq).tolist(),
+        }
+
+
+### 64-bit group keys (e.g. of nets) that are unique across designs
+def group_keys(design, keys):
+    salt = pd.util.hash_array(np.array([design], dtype=object))[0]
+    return pd.util.hash_array(pd.util.hash_array(np.asarray(keys)) ^ salt)
+
+
+### test rows by a hash of the group key, so every group lands in one split,
+### whatever the row order or the shard it comes in
+def split_groups(groups, test_frac, seed=0):
+    h = pd.util.hash_array(np.asarray(groups, dtype=np.uint64) ^ np.uint64(seed))
+    return (h % np.uint64(1 << 20)) < np.uint64(int(test_frac * (1 << 20)))
+
+
+### fixed-size .npy shards of features / labels per split:
+###   <split>-<n>.x.npy (float), <split>-<n>.y.npy, <split>-<n>.group.npy
+### plus manifest.json with the shards and train split statistics
+class ShardWriter:
+    def __init__(
+        self,
+        out_dir,
+        feature_cols=STAGE_DELAY_FEATURES,
+        label_cols=STAGE_DELAY_LABELS,
+        group_col="net_id",
+        shard_rows=1 << 16,
+        test_frac=0.05,
+        seed=0,
+        dtype="float32",
+    ):
+        self.out_dir = out_dir
+        self.feature_cols = list(feature_cols)
+        self.label_cols = list(label_cols)
+        self.group_col = group_col
+        self.shard_rows = shard_rows
+        self.test_frac = test_frac
+        self.seed = seed
+        self.dtype = np.dtype(dtype)
+        os.makedirs(out_dir, exist_ok=True)
+
+        self.shards = {s: [] for s in SPLITS}
+        self._buf = {s: [] for s in SPLITS}
+        self._buf_rows = {s: 0 for s in SPLITS}
+        self.x_stats = RunningStats(len(self.feature_cols))
+        self.y_stats = RunningStats(len(self.label_cols))
+        self.designs = []
+
+    def add(self, df, design=""):
+        # rows of one extractor table, e.g. sink_pin_info of one design
+        x = df[self.feature_cols].to_numpy(dtype=float)
+        y = df[self.label_cols].to_numpy(dtype=float)
+        group = group_keys(design, df[self.group_col].to_numpy())
+        is_test = split_groups(group, self.test_frac, self.seed)
+        self.designs.append({"name": design, "num_rows": len(df)})
+
+        for split, mask in zip(SPLITS, [~is_test, is_test]):
+            if split == "train":
+                self.x_stats.update(x[mask])
+                self.y_stats.update(y[mask])
+            self._buf[split].append(
+                (x[mask].astype(self.dtype), y[mask].astype(self.dtype), group[mask])
+            )
+            self._buf_rows[split] += int(mask.sum())
+            while self._buf_rows[split] >= self.shard_rows:
+                self._flush(split, self.shard_rows)
+
+    def _flush(self, split, n):
+        x, y, g = (np.concatenate(a) for a in zip(*self._buf[split]))
+        name = f"{split}-{len(self.shards[split]):05d}"
+        for suffix, values in [("x", x[:n]), ("y", y[:n]), ("group", g[:n])]:
+            np.save(os.path.join(self.out_dir, f"{name}.{suffix}.npy"), values)
+        self.shards[split].append({"name": name, "num_rows": min(n, len(x))})
+        self._buf[split] = [(x[n:], y[n:], g[n:])]
+        self._buf_rows[split] = len(x) - min(n, len(x))
+
+    def close(self):
+        for split in SPLITS:
+            if self._buf_rows[split]:
+                self._flush(split, self._buf_rows[split])
+        manifest = {
+            "format": DATASET_FORMAT,
+            "version": DATASET_VERSION,
+            "feature_cols": self.feature_cols,
+            "label_cols": self.label_cols,
+            "group_col": self.group_col,
+            "dtype": self.dtype.str,
+            "shard_rows": self.shard_rows,
+            "test_frac": self.test_frac,
+            "seed": self.seed,
+            "designs": self.designs,
+            "splits": {
+                s: {
+                    "num_rows": sum(sh["num_rows"] for sh in self.shards[s]),
+                    "shards": self.shards[s],
+                }
+                for s in SPLITS
+            },
+            # normalization statistics, train split only; count is the number
+            # of finite values per column out of rows
+            "stats": {"x": self.x_stats.to_dict(), "y": self.y_stats.to_dict()},
+        }
+        with open(os.path.join(self.out_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=1)
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"Not a dataset directory: {path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != DATASET_FORMAT:
+        raise ValueError(f"Not a dataset directory: {path}")
+    if manifest.get("version") != DATASET_VERSION:
+        raise ValueError(
+            f"Unsupported dataset version {manifest.get('version')}, "
+            f"expected {DATASET_VERSION}"
+        )
+    return manifest
+
+
+def get_scale(stats, normalize):
+    # (shift, scale) with x -> (x - shift) / scale, None without normalization
+    if normalize is None:
+        return None
+    if normalize == "standard":
+        shift, scale = np.array(stats["mean"]), np.array(stats["std"])
+    else:
+        shift, scale = np.zeros(len(stats["l2"])), np.array(stats["l2"])
+    scale[scale == 0] = 1.0
+    return shift.astype(np.float32), scale.astype(np.float32)
+
+
+### (x, y) batches of one split, one memory-mapped shard at a time
+### normalize: None, "standard" ((x - mean) / std) or "l2" (x / column L2
+### norm); the statistics are of the train split only, unlike the notebook's
+### preprocessing.normalize(axis=0) over all rows, so test rows do not leak
+### into training. Non-finite values are left out of them and stay NaN / inf
+class ShardReader:
+    def __init__(
+        self,
+        path,
+        split="train",
+        batch_size=4096,
+        shuffle=True,
+        normalize="standard",
+        normalize_labels=False,
+        seed=0,
+    ):
+        if split not in SPLITS:
+            raise ValueError(f"split must be one of {SPLITS}")
+        if normalize not in (None, "standard", "l2"):
+            raise ValueError("normalize must be None, 'standard' or 'l2'")
+        self.path = path
+        self.manifest = read_manifest(path)
+        self.shards = self.manifest["splits"][split]["shards"]
+        self.num_rows = self.manifest["splits"][split]["num_rows"]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+        stats = self.manifest["stats"]
+        self.x_scale = get_scale(stats["x"], normalize)
+        self.y_scale = get_scale(stats["y"], normalize if normalize_labels else None)
+
+    def __len__(self):
+        return (self.num_rows + self.batch_size - 1) // self.batch_size
+
+    def _load(self, name, suffix):
+        return np.load(os.path.join(self.path, f"{name}.{suffix}.npy"), mmap_mode="r")
+
+    def _apply(self, values, scale):
+        values = np.asarray(values, dtype=np.float32)
+        return values if scale is None else (values - scale[0]) / scale[1]
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        self.epoch += 1
+        order = (
+            rng.permutation(len(self.shards))
+            if self.shuffle
+            else range(len(self.shards))
+        )
+        rest_x, rest_y = [], []
+        for i in order:
+            name = self.shards[i]["name"]
+            x, y = self._load(name, "x"), self._load(name, "y")
+            rows = rng.permutation(len(x)) if self.shuffle else np.arange(len(x))
+            # leftover rows of the previous shard go first
+            x = np.concatenate(rest_x + [x[rows]])
+            y = np.concatenate(rest_y + [y[rows]])
+            n_full = len(x) // self.batch_size * self.batch_size
+            for lo in range(0, n_full, self.batch_size):
+                yield (
+                    self._apply(x[lo : lo + self.batch_size], self.x_scale),
+                    self._apply(y[lo : lo + self.batch_size], self.y_scale),
+                )
+            rest_x, rest_y = [x[n_full:]], [y[n_full:]]
+        if rest_x and len(rest_x[0]):
+            yield self._apply(rest_x[0], self.x_scale), self._apply(
+                rest_y[0], self.y_scale
+            )
+
+
+### driver/sink features of every design under ir_root into one dataset
+def export_designs(ir_root, out_dir, cell_cnt_th=200, label_min=0.0, **kwargs):
+    from circuitops_batch import build_manager, discover_designs
+
+    with ShardWriter(out_dir, **kwargs) as writer:
+        for design in discover_designs(ir_root):
+            com, pin_pin_df = build_manager(os.path.join(ir_root, design))
+            _, sink_pin_info = com.get_driver_sink_info_fast(
+                pin_pin_df, com.get_selected_pins(cell_cnt_th)
+            )
+            # rows without a positive label are left out, as in the notebook
+            if label_min is not None:
+                keep = (sink_pin_info[writer.label_cols] > label_min).all(axis=1)
+                sink_pin_info = sink_pin_info[keep]
+            print(f"{design}: {len(sink_pin_info)} rows")
+            writer.add(sink_pin_info, design)
+    return read_manifest(out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export driver/sink features of IR directories as dataset shards"
+    )
+    parser.add_argument("ir_root")
+    parser.add_argument("out_dir")
+    parser.add_argument("--shard-rows", type=int, default=1 << 16)
+    parser.add_argument("--test-frac", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cell-cnt-th", type=int, default=200)
+    args = parser.parse_args()
+    manifest = export_designs(
+        args.ir_root,
+        args.out_dir,
+        cell_cnt_th=args.cell_cnt_th,
+        shard_rows=args.shard_rows,
+        test_frac=args.test_frac,
+        seed=args.seed,
+    )
+    for split, info in manifest["splits"].items():
+        print(f"{split}: {info['num_rows']} rows, {len(info['shards'])} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import circuitops_helper as coh
+
+TIMING_COLS = ["slack", "risearr", "fallarr", "tran"]
+CELL_COLS = ["cell_name", "libcell_name", "x0", "y0", "x1", "y1"]
+PIN_COLS = [
+    "pin_name",
+    "net_name",
+    "pin_slack",
+    "pin_rise_arr",
+    "pin_fall_arr",
+    "pin_tran",
+]
+
+
+### only the columns the diff needs, with the update_vertices names
+def read_diff_tables(data_root):
+    cell_df = coh.read_table(data_root, "cell_properties.csv", usecols=CELL_COLS)
+    pin_df = coh.read_table(data_root, "pin_properties.csv", usecols=PIN_COLS)
+    # one row per arc (src, tar), arcs are the join key
+    pin_pin_df = coh.read_table(
+        data_root, "pin_pin_edge.csv", usecols=["src", "tar", "arc_delay"]
+    ).drop_duplicates(["src", "tar"])
+    return {
+        "cell": cell_df.rename(columns=coh.CELL_RENAME),
+        "pin": pin_df.rename(columns=coh.PIN_RENAME),
+        "pin_pin": pin_pin_df,
+    }
+
+
+### hash join on keys: row in b of every key of a, -1 if missing
+def match_keys(keys_a, keys_b):
+    index_b = pd.Index(keys_b)
+    if not index_b.is_unique:
+        raise ValueError("keys must be unique")
+    return index_b.get_indexer(keys_a)
+
+
+def _added_removed(a_idx, n_b):
+    removed = np.flatnonzero(a_idx < 0)
+    b_hit = np.zeros(n_b, dtype=bool)
+    b_hit[a_idx[a_idx >= 0]] = True
+    added = np.flatnonzero(~b_hit)
+    return added, removed
+
+
+def _changed(a, b, rtol, atol):
+    # NaN on both sides is no change
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    return ~(np.isclose(a, b, rtol=rtol, atol=atol) | (np.isnan(a) & np.isnan(b)))
+
+
+def diff_cells(cell_a, cell_b):
+    # added / removed / resized (other libcell) / moved (other bbox) cells
+    a_idx = match_keys(cell_a["name"], cell_b["name"])
+    added, removed = _added_removed(a_idx, len(cell_b))
+    both = np.flatnonzero(a_idx >= 0)
+    b_rows = a_idx[both]
+
+    ref_a = cell_a["ref"].to_numpy()[both]
+    ref_b = cell_b["ref"].to_numpy()[b_rows]
+    resized = ref_a != ref_b
+    box = ["x0", "y0", "x1", "y1"]
+    moved = (cell_a[box].to_numpy()[both] != cell_b[box].to_numpy()[b_rows]).any(axis=1)
+    cx_a = 0.5 * (cell_a["x0"] + cell_a["x1"]).to_numpy()
+    cy_a = 0.5 * (cell_a["y0"] + cell_a["y1"]).to_numpy()
+    cx_b = 0.5 * (cell_b["x0"] + cell_b["x1"]).to_numpy()
+    cy_b = 0.5 * (cell_b["y0"] + cell_b["y1"]).to_numpy()
+
+    parts = [
+        pd.DataFrame(
+            {
+                "name": cell_a["name"].to_numpy()[removed],
+                "change": "removed",
+                "ref_a": cell_a["ref"].to_numpy()[removed],
+                "ref_b": None,
+            }
+        ),
+        pd.DataFrame(
+            {
+                "name": cell_b["name"].to_numpy()[added],
+                "change": "added",
+                "ref_a": None,
+                "ref_b": cell_b["ref"].to_numpy()[added],
+            }
+        ),
+    ]
+    for change, mask in [("resized", resized), ("moved", moved & ~resized)]:
+        rows = both[mask]
+        parts.append(
+            pd.DataFrame(
+                {
+                    "name": cell_a["name"].to_numpy()[rows],
+                    "change": change,
+                    "ref_a": ref_a[mask],
+                    "ref_b": ref_b[mask],
+                    "dx": cx_b[b_rows[mask]] - cx_a[rows],
+                    "dy": cy_b[b_rows[mask]] - cy_a[rows],
+                }
+            )
+        )
+    return pd.concat(parts, ignore_index=True)
+
+
+def net_signatures(pin_df):
+    # order-independent signature of the pin set of every net: pin count and
+    # two sums of 64-bit pin name hashes (wrapping)
+    pins = pin_df.dropna(subset=["netname"])
+    h = pd.util.hash_array(pins["name"].to_numpy(dtype=object))
+    codes, names = pd.factorize(pins["netname"])
+    order, start, nets = coh.get_segments(codes)
+    nets = np.asarray(names, dtype=object)[nets]
+    h = h[order]
+    with np.errstate(over="ignore"):
+        h2 = h * np.uint64(0x9E3779B97F4A7C15) + np.uint64(0x632BE59BD9B4E019)
+    return pd.DataFrame(
+        {
+            "net": nets,
+            "num_pins": np.diff(np.append(start, len(h))),
+            "h1": np.add.reduceat(h, start) if len(h) else h,
+            "h2": np.add.reduceat(h2 ^ (h2 >> np.uint64(29)), start) if len(h) else h,
+        }
+    )
+
+
+def diff_nets(pin_a, pin_b):
+    # added / removed nets and rewired nets (same name, other pin set)
+    sig_a, sig_b = net_signatures(pin_a), net_signatures(pin_b)
+    a_idx = match_keys(sig_a["net"], sig_b["net"])
+    added, removed = _added_removed(a_idx, len(sig_b))
+    both = np.flatnonzero(a_idx >= 0)
+    b_rows = a_idx[both]
+    rewired = (
+        (sig_a["num_pins"].to_numpy()[both] != sig_b["num_pins"].to_numpy()[b_rows])
+        | (sig_a["h1"].to_numpy()[both] != sig_b["h1"].to_numpy()[b_rows])
+        | (sig_a["h2"].to_numpy()[both] != sig_b["h2"].to_numpy()[b_rows])
+    )
+    rows_a = np.concatenate([removed, both[rewired]])
+    n_a = sig_a["num_pins"].to_numpy()
+    # removed nets have no pins in b: index the appended 0
+    n_b = np.append(sig_b["num_pins"].to_numpy(), 0)
+    rows_b = np.concatenate([np.full(len(removed), -1), b_rows[rewired]])
+    out = pd.DataFrame(
+        {
+            "net": np.concatenate(
+                [sig_a["net"].to_numpy()[rows_a], sig_b["net"].to_numpy()[added]]
+            ),
+            "change": ["removed"] * len(removed)
+            + ["rewired"] * int(rewired.sum())
+            + ["added"] * len(added),
+            "num_pins_a": np.concatenate(
+                [n_a[rows_a], np.zeros(len(added), dtype=np.int64)]
+            ),
+            "num_pins_b": np.concatenate([n_b[rows_b], n_b[added]]),
+        }
+    )
+    return out
+
+
+def diff_timing(pin_a, pin_b, cols=TIMING_COLS, rtol=1e-6, atol=0.0):
+    # changed timing values of pins in both designs, one row per (pin, column)
+    a_idx = match_keys(pin_a["name"], pin_b["name"])
+    both = np.flatnonzero(a_idx >= 0)
+    b_rows = a_idx[both]
+    parts = []
+    for col in cols:
+        va = pin_a[col].to_numpy(dtype=float)[both]
+        vb = pin_b[col].to_numpy(dtype=float)[b_rows]
+        mask = _changed(va, vb, rtol, atol)
+        parts.append(
+            pd.DataFrame(
+                {
+                    "name": pin_a["name"].to_numpy()[both[mask]],
+                    "column": col,
+                    "a": va[mask],
+                    "b": vb[mask],
+                    "delta": vb[mask] - va[mask],
+                }
+            )
+        )
+    return pd.concat(parts, ignore_index=True)
+
+
+def diff_arcs(pin_pin_a, pin_pin_b, rtol=1e-6, atol=0.0):
+    # added / removed arcs and arcs with another delay, keyed by (src, tar)
+    # pin names coded once over both tables, (src, tar) packed in one int64
+    n_a, n_b = len(pin_pin_a), len(pin_pin_b)
+    codes, names = pd.factorize(
+        np.concatenate(
+            [
+                pin_pin_a["src"].to_numpy(dtype=object),
+                pin_pin_a["tar"].to_numpy(dtype=object),
+                pin_pin_b["src"].to_numpy(dtype=object),
+                pin_pin_b["tar"].to_numpy(dtype=object),
+            ]
+        )
+    )
+    n = max(len(names), 1)
+    key_a = codes[:n_a].astype(np.int64) * n + codes[n_a : 2 * n_a]
+    key_b = codes[2 * n_a : 2 * n_a + n_b].astype(np.int64) * n + codes[2 * n_a + n_b :]
+    a_idx = match_keys(key_a, key_b)
+    added, removed = _added_removed(a_idx, len(pin_pin_b))
+    both = np.flatnonzero(a_idx >= 0)
+    b_rows = a_idx[both]
+    da = pin_pin_a["arc_delay"].to_numpy(dtype=float)
+    db = pin_pin_b["arc_delay"].to_numpy(dtype=float)
+    changed = _changed(da[both], db[b_rows], rtol, atol)
+
+    rows_a = np.concatenate([removed, both[changed], np.full(len(added), -1)])
+    rows_b = np.concatenate([np.full(len(removed), -1), b_rows[changed], added])
+    in_a = rows_a >= 0
+    src = np.empty(len(rows_a), dtype=object)
+    tar = np.empty(len(rows_a), dtype=object)
+    src[in_a] = pin_pin_a["src"].to_numpy()[rows_a[in_a]]
+    tar[in_a] = pin_pin_a["tar"].to_numpy()[rows_a[in_a]]
+    src[~in_a] = pin_pin_b["src"].to_numpy()[rows_b[~in_a]]
+    tar[~in_a] = pin_pin_b["tar"].to_numpy()[rows_b[~in_a]]
+    delay_a = np.full(len(rows_a), np.nan)
+    delay_b = np.full(len(rows_b), np.nan)
+    delay_a[in_a] = da[rows_a[in_a]]
+    delay_b[rows_b >= 0] = db[rows_b[rows_b >= 0]]
+    return pd.DataFrame(
+        {
+            "src": src,
+            "tar": tar,
+            "change": ["removed"] * len(removed)
+            + ["changed"] * int(changed.sum())
+            + ["added"] * len(added),
+            "arc_delay_a": delay_a,
+            "arc_delay_b": delay_b,
+        }
+    )
+
+
+### all delta tables between two IR directories, e.g. two flow stages
+def diff_designs(root_a, root_b, rtol=1e-6, atol=0.0):
+    a, b = read_diff_tables(root_a), read_diff_tables(root_b)
+    return {
+        "cells": diff_cells(a["cell"], b["cell"]),
+        "nets": diff_nets(a["pin"], b["pin"]),
+        "timing": diff_timing(a["pin"], b["pin"], rtol=rtol, atol=atol),
+        "arcs": diff_arcs(a["pin_pin"], b["pin_pin"], rtol=rtol, atol=atol),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two CircuitOps IR directories")
+    parser.add_argument("root_a")
+    parser.add_argument("root_b")
+    parser.add_argument("-o", "--out-dir", default=None, help="write delta CSVs")
+    parser.add_argument("--rtol", type=float, default=1e-6)
+    parser.add_argument("--atol", type=float, default=0.0)
+    args = parser.parse_args()
+
+    deltas = diff_designs(args.root_a, args.root_b, args.rtol, args.atol)
+    for name, df in deltas.items():
+        counts = df["change" if "change" in df else "column"].value_counts()
+        print(f"{name}: {dict(counts)}")
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+            df.to_csv(os.path.join(args.out_dir, f"{name}_diff.csv"), index=False)
+
+
+if __name__ == "__main__":
+    main()
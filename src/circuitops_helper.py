@@ -14,7 +14,12 @@
 # limitations under the License.
 
 
+import glob
+import hashlib
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 from numpy.random import *
@@ -85,30 +90,31 @@ def read_tables(data_root, design, mcmm):
     )
 
 
+### column names of the OpenROAD tables -> names used in the dataframes
+PIN_RENAME = {
+    "pin_name": "name",
+    "cell_name": "cellname",
+    "net_name": "netname",
+    "pin_tran": "tran",
+    "pin_slack": "slack",
+    "pin_rise_arr": "risearr",
+    "pin_fall_arr": "fallarr",
+    "input_pin_cap": "cap",
+    "is_startpoint": "is_start",
+    "is_endpoint": "is_end",
+}
+CELL_RENAME = {
+    "cell_name": "name",
+    "libcell_name": "ref",
+    "cell_static_power": "staticpower",
+    "cell_dynamic_power": "dynamicpower",
+}
+
+
 def update_vertices(pin_df, cell_df, net_df, fo4_df):
     #### rename dfs
-    pin_df = pin_df.rename(
-        columns={
-            "pin_name": "name",
-            "cell_name": "cellname",
-            "net_name": "netname",
-            "pin_tran": "tran",
-            "pin_slack": "slack",
-            "pin_rise_arr": "risearr",
-            "pin_fall_arr": "fallarr",
-            "input_pin_cap": "cap",
-            "is_startpoint": "is_start",
-            "is_endpoint": "is_end",
-        }
-    )
-    cell_df = cell_df.rename(
-        columns={
-            "cell_name": "name",
-            "libcell_name": "ref",
-            "cell_static_power": "staticpower",
-            "cell_dynamic_power": "dynamicpower",
-        }
-    )
+    pin_df = pin_df.rename(columns=PIN_RENAME)
+    cell_df = cell_df.rename(columns=CELL_RENAME)
     net_df = net_df.rename(columns={"net_name": "name"})
 
     fo4_df = fo4_df.rename(columns={"libcell_name": "ref"})
@@ -150,31 +156,95 @@ def update_vertices(pin_df, cell_df, net_df, fo4_df):
     return pin_df, cell_df, net_df, fo4_df
 
 
-### generate pandas dataframes by reading csv files
-def read_tables_OpenROAD(data_root, design=None):
+### files of one IR table: the table itself, or its shards
+### (e.g. pin_properties.part-0003.csv) in shard order, plain or compressed
+### (pin_properties.csv.gz, ...), shards may mix compressions; [] if there
+### are none. Ambiguous layouts (the table in several compressions, the
+### table and shards, a shard in several compressions) raise ValueError
+SHARD_RE = re.compile(r"\.part-(\d+)\.")
+COMPRESSION_SUFFIX = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def find_table(data_root, fname):
+    path = os.path.join(data_root, fname)
+    stem, ext = os.path.splitext(path)
+    whole, parts = [], []
+    for suffix in COMPRESSION_SUFFIX.values():
+        if os.path.exists(path + suffix):
+            whole.append(path + suffix)
+        parts += glob.glob(glob.escape(stem) + ".part-*" + ext + suffix)
+    if whole and parts or len(whole) > 1:
+        raise ValueError(f"Ambiguous table files: {sorted(whole + parts)}")
+    if whole:
+        return whole
+    shard = [int(SHARD_RE.search(p).group(1)) for p in parts]
+    if len(set(shard)) < len(shard):
+        raise ValueError(f"Shards in several compressions: {sorted(parts)}")
+    return [p for _, p in sorted(zip(shard, parts))]
+
+
+### one IR table to output_dir, compression: None, "gzip" or "zstd"
+def write_table(df, output_dir, fname, compression=None):
+    if compression not in COMPRESSION_SUFFIX:
+        raise ValueError(f"Unsupported compression: {compression}")
+    path = os.path.join(output_dir, fname + COMPRESSION_SUFFIX[compression])
+    df.to_csv(path, index=False, compression=compression)
+    return path
+
+
+### key columns of an IR table: (src, tar) of edge tables, name of vertex tables
+def get_table_key(df):
+    return ["src", "tar"] if "src" in df and "tar" in df else [df.columns[0]]
+
+
+### src_type / tar_type of the edge tables, per row (e.g. net_pin has both
+### net -> pin and pin -> net rows). Not read by default: get_edge_id_maps
+### resolves every endpoint name against all vertex tables, so the vertex kind,
+### and with it the direction, of an edge comes back from the name lookup.
+### circuitops_ooc reads them to tell apart names shared between vertex kinds
+TYPE_COLS = ["src_type", "tar_type"]
+
+
+### one IR table; shards are read concurrently and concatenated once, rows
+### whose key is already in an earlier shard (overlaps at shard boundaries)
+### are dropped. Compression is inferred from the file name. kwargs go to
+### pd.read_csv, TYPE_COLS are not read unless usecols is given
+def read_table(data_root, fname, max_workers=None, **kwargs):
+    kwargs.setdefault("usecols", lambda c: c not in TYPE_COLS)
+    paths = find_table(data_root, fname)
+    if not paths:
+        raise FileNotFoundError(os.path.join(data_root, fname))
+    if len(paths) == 1:
+        return pd.read_csv(paths[0], **kwargs)
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        parts = list(pool.map(lambda p: pd.read_csv(p, **kwargs), paths))
+    df = pd.concat(parts, ignore_index=True)
+    shard = np.repeat(np.arange(len(parts)), [len(p) for p in parts])
+    key = df.groupby(get_table_key(df), sort=False, dropna=False).ngroup().to_numpy()
+    first = np.full(key.max() + 1 if len(key) else 0, len(parts))
+    np.minimum.at(first, key, shard)
+    keep = shard == first[key]
+    if not keep.all():
+        print(f"{fname}: {int((~keep).sum())} rows repeated across shards")
+        df = df[keep].reset_index(drop=True)
+    return df
 
-    cell_cell_path = data_root + "cell_cell_edge.csv"
-    cell_pin_path = data_root + "cell_pin_edge.csv"
-    cell_path = data_root + "cell_properties.csv"
-    net_pin_path = data_root + "net_pin_edge.csv"
-    net_path = data_root + "net_properties.csv"
-    pin_pin_path = data_root + "pin_pin_edge.csv"
-    pin_path = data_root + "pin_properties.csv"
-    net_cell_path = data_root + "cell_net_edge.csv"
 
-    all_fo4_delay_path = data_root + "libcell_properties.csv"
+### generate pandas dataframes by reading csv files
+def read_tables_OpenROAD(data_root, design=None):
 
     ### load tables
-    fo4_df = pd.read_csv(all_fo4_delay_path)
+    fo4_df = read_table(data_root, "libcell_properties.csv")
 
-    pin_df = pd.read_csv(pin_path)
-    cell_df = pd.read_csv(cell_path)
-    net_df = pd.read_csv(net_path)
-    cell_cell_df = pd.read_csv(cell_cell_path)
-    pin_pin_df = pd.read_csv(pin_pin_path)
-    cell_pin_df = pd.read_csv(cell_pin_path)
-    net_pin_df = pd.read_csv(net_pin_path)
-    net_cell_df = pd.read_csv(net_cell_path)
+    pin_df = read_table(data_root, "pin_properties.csv")
+    cell_df = read_table(data_root, "cell_properties.csv")
+    net_df = read_table(data_root, "net_properties.csv")
+    cell_cell_df = read_table(data_root, "cell_cell_edge.csv")
+    pin_pin_df = read_table(data_root, "pin_pin_edge.csv")
+    cell_pin_df = read_table(data_root, "cell_pin_edge.csv")
+    net_pin_df = read_table(data_root, "net_pin_edge.csv")
+    net_cell_df = read_table(data_root, "cell_net_edge.csv")
 
     return (
         pin_df,
@@ -189,6 +259,86 @@ def read_tables_OpenROAD(data_root, design=None):
     )
 
 
+### hierarchy separators in instance names, escaped ones (e.g. "\.") are kept
+HIER_SEP_RE = re.compile(r"(?<!\\)[./]")
+
+
+### module path of hierarchical instance names, cut at `depth` levels if given
+def get_hier_path(names, depth=None):
+    paths = []
+    for name in names:
+        pos = [m.start() for m in HIER_SEP_RE.finditer(name)]
+        if depth is not None:
+            pos = pos[:depth]
+        paths.append(name[: pos[-1]] if pos else "")
+    return np.asarray(paths, dtype=object)
+
+
+### sort keys into segments, return (order, start offset of each segment, segment keys)
+def get_segments(keys):
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else []
+    start = np.asarray(start, dtype=np.int64)
+    return order, start, keys[start]
+
+
+### nan-aware reductions over values sorted by segment, same results as pandas groupby
+def segment_agg(values, start, hows):
+    n_seg = len(start)
+    if n_seg == 0:
+        return {how: np.zeros(0, dtype=float) for how in hows}
+
+    nan = np.isnan(values) if values.dtype.kind == "f" else np.zeros(len(values), bool)
+    filled = np.where(nan, 0, values)
+    count = np.add.reduceat(~nan, start).astype(np.int64)
+    seg_sum = np.add.reduceat(filled, start)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = seg_sum / count
+
+    res = {}
+    for how in hows:
+        if how == "count":
+            res[how] = count
+        elif how == "sum":
+            res[how] = seg_sum
+        elif how == "mean":
+            res[how] = mean
+        elif how == "min":
+            res[how] = np.fmin.reduceat(values, start)
+        elif how == "max":
+            res[how] = np.fmax.reduceat(values, start)
+        elif how == "std":
+            seg_id = np.repeat(np.arange(n_seg), np.diff(np.r_[start, len(values)]))
+            dev = np.where(nan, 0, values - mean[seg_id])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                var = np.add.reduceat(dev * dev, start) / (count - 1)
+            res[how] = np.where(count > 1, np.sqrt(var), np.nan)
+        else:
+            raise ValueError(f"Unsupported segment reduction: {how}")
+    return res
+
+
+### topology identity of a design: pin names with their cell / net, in row
+### order, and the (src_id, tar_id) sequence of its pin_pin arcs if given
+def topology_fingerprint(pin_df, arc_src=None, arc_tar=None):
+    h = hashlib.blake2b(digest_size=16)
+    pins = pin_df[["name", "cellname", "netname"]]
+    h.update(pd.util.hash_pandas_object(pins, index=False).to_numpy().tobytes())
+    if arc_src is not None:
+        h.update(np.asarray(arc_src, dtype=np.int64).tobytes())
+        h.update(np.asarray(arc_tar, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+### read the corner-dependent tables of one more corner, renamed like update_vertices
+def read_corner_tables_OpenROAD(data_root):
+    pin_df = read_table(data_root, "pin_properties.csv").rename(columns=PIN_RENAME)
+    cell_df = read_table(data_root, "cell_properties.csv").rename(columns=CELL_RENAME)
+    pin_pin_df = read_table(data_root, "pin_pin_edge.csv")
+    return pin_df, cell_df, pin_pin_df
+
+
 ### remove pins and cell with arrival time > 1000 or infinite slack
 def rm_invalid_pins_cells(pin_df, cell_df):
     invalid_mask = (np.isinf(pin_df.slack)) | (pin_df.arr > 1000)
@@ -420,17 +570,8 @@ def generate_edge_df(
     )
 
 
-### 1) get edge src and tar ids and 2) generate edge_df by merging all edges
-def generate_edge_df_OpenROAD(
-    pin_df,
-    cell_df,
-    net_df,
-    pin_pin_df,
-    cell_pin_df,
-    net_pin_df,
-    net_cell_df,
-    cell_cell_df,
-):
+### vertex name -> id tables for the src / tar columns of the edge tables
+def get_edge_id_maps(pin_df, cell_df, net_df):
     edge_id = pd.concat(
         [
             pin_df.loc[:, ["id", "name"]],
@@ -443,52 +584,40 @@ def generate_edge_df_OpenROAD(
     src = src.rename(columns={"id": "src_id", "name": "src"})
     tar = edge_id.copy()
     tar = tar.rename(columns={"id": "tar_id", "name": "tar"})
+    return src, tar
 
-    pin_pin_df = pin_pin_df.merge(src, on="src", how="left")
-    pin_pin_df = pin_pin_df.merge(tar, on="tar", how="left")
 
-    cell_pin_df = cell_pin_df.merge(src, on="src", how="left")
-    cell_pin_df = cell_pin_df.merge(tar, on="tar", how="left")
+### add src_id / tar_id to one edge table and drop illegal edges
+def resolve_edge_ids(edge_df, src, tar, label):
+    edge_df = edge_df.merge(src, on="src", how="left")
+    edge_df = edge_df.merge(tar, on="tar", how="left")
 
-    net_pin_df = net_pin_df.merge(src, on="src", how="left")
-    net_pin_df = net_pin_df.merge(tar, on="tar", how="left")
+    idx = edge_df[pd.isna(edge_df.src_id)].index
+    edge_df = edge_df.drop(idx)
+    idx = edge_df[pd.isna(edge_df.tar_id)].index
+    edge_df = edge_df.drop(idx)
+    print(f"{label} shape: {edge_df.shape}")
+    return edge_df
 
-    net_cell_df = net_cell_df.merge(src, on="src", how="left")
-    net_cell_df = net_cell_df.merge(tar, on="tar", how="left")
 
-    cell_cell_df = cell_cell_df.merge(src, on="src", how="left")
-    cell_cell_df = cell_cell_df.merge(tar, on="tar", how="left")
+### 1) get edge src and tar ids and 2) generate edge_df by merging all edges
+def generate_edge_df_OpenROAD(
+    pin_df,
+    cell_df,
+    net_df,
+    pin_pin_df,
+    cell_pin_df,
+    net_pin_df,
+    net_cell_df,
+    cell_cell_df,
+):
+    src, tar = get_edge_id_maps(pin_df, cell_df, net_df)
 
-    # drop illegal edges
-    idx = pin_pin_df[pd.isna(pin_pin_df.src_id)].index
-    pin_pin_df = pin_pin_df.drop(idx)
-    idx = pin_pin_df[pd.isna(pin_pin_df.tar_id)].index
-    pin_pin_df = pin_pin_df.drop(idx)
-    print(f"pin_pin shape: {pin_pin_df.shape}")
-
-    idx = cell_pin_df[pd.isna(cell_pin_df.src_id)].index
-    cell_pin_df = cell_pin_df.drop(idx)
-    idx = cell_pin_df[pd.isna(cell_pin_df.tar_id)].index
-    cell_pin_df = cell_pin_df.drop(idx)
-    print(f"cell_pin shape: {cell_pin_df.shape}")
-
-    idx = net_pin_df[pd.isna(net_pin_df.src_id)].index
-    net_pin_df = net_pin_df.drop(idx)
-    idx = net_pin_df[pd.isna(net_pin_df.tar_id)].index
-    net_pin_df = net_pin_df.drop(idx)
-    print(f"net_pin shape: {net_pin_df.shape}")
-
-    idx = net_cell_df[pd.isna(net_cell_df.src_id)].index
-    net_cell_df = net_cell_df.drop(idx)
-    idx = net_cell_df[pd.isna(net_cell_df.tar_id)].index
-    net_cell_df = net_cell_df.drop(idx)
-    print(f"net_cell shape: {net_cell_df.shape}")
-
-    idx = cell_cell_df[pd.isna(cell_cell_df.src_id)].index
-    cell_cell_df = cell_cell_df.drop(idx)
-    idx = cell_cell_df[pd.isna(cell_cell_df.tar_id)].index
-    cell_cell_df = cell_cell_df.drop(idx)
-    print(f"cell_cell shape: {cell_cell_df.shape}")
+    pin_pin_df = resolve_edge_ids(pin_pin_df, src, tar, "pin_pin")
+    cell_pin_df = resolve_edge_ids(cell_pin_df, src, tar, "cell_pin")
+    net_pin_df = resolve_edge_ids(net_pin_df, src, tar, "net_pin")
+    net_cell_df = resolve_edge_ids(net_cell_df, src, tar, "net_cell")
+    cell_cell_df = resolve_edge_ids(cell_cell_df, src, tar, "cell_cell")
 
     edge_df = pd.concat(
         [
@@ -548,6 +677,72 @@ def update_edges(
     return pin_pin_df, cell_pin_df, net_pin_df, net_cell_df, cell_cell_df, edge_df
 
 
+### OpenROAD tables: vertex tables, edge tables in edge type order
+VERTEX_TABLES_OpenROAD = {
+    "pin": "pin_properties.csv",
+    "cell": "cell_properties.csv",
+    "net": "net_properties.csv",
+    "fo4": "libcell_properties.csv",
+}
+EDGE_TABLES_OpenROAD = {
+    "pin_pin": "pin_pin_edge.csv",
+    "cell_pin": "cell_pin_edge.csv",
+    "net_pin": "net_pin_edge.csv",
+    "net_cell": "cell_net_edge.csv",
+    "cell_cell": "cell_cell_edge.csv",
+}
+
+
+### read_tables_OpenROAD -> update_vertices -> generate_edge_df_OpenROAD ->
+### update_edges with the stages overlapped: vertices are updated while edge
+### tables are still read, every edge table is resolved as soon as it and the
+### vertex ids are ready. Same results as the sequential steps
+def load_tables_OpenROAD(data_root, max_workers=None):
+    # tasks only wait for tasks submitted before them, so any pool size works
+    with ThreadPoolExecutor(max_workers) as pool:
+        reads = {
+            k: pool.submit(read_table, data_root, f)
+            for k, f in {**VERTEX_TABLES_OpenROAD, **EDGE_TABLES_OpenROAD}.items()
+        }
+
+        def vertices():
+            pin_df, cell_df, net_df, fo4_df = update_vertices(
+                *[reads[k].result() for k in VERTEX_TABLES_OpenROAD]
+            )
+            src, tar = get_edge_id_maps(pin_df, cell_df, net_df)
+            return pin_df, cell_df, net_df, fo4_df, src, tar
+
+        vertex_job = pool.submit(vertices)
+
+        def resolve(k):
+            edge_df = reads[k].result()
+            *_, src, tar = vertex_job.result()
+            return resolve_edge_ids(edge_df, src, tar, k)
+
+        edge_jobs = [pool.submit(resolve, k) for k in EDGE_TABLES_OpenROAD]
+        pin_df, cell_df, net_df, fo4_df, _, _ = vertex_job.result()
+        edge_dfs = [job.result() for job in edge_jobs]
+
+    edge_df = pd.concat(
+        [df.loc[:, ["src_id", "tar_id"]] for df in edge_dfs], ignore_index=True
+    )
+    pin_pin_df, cell_pin_df, net_pin_df, net_cell_df, cell_cell_df, edge_df = (
+        update_edges(*edge_dfs, edge_df)
+    )
+    return (
+        pin_df,
+        cell_df,
+        net_df,
+        pin_pin_df,
+        cell_pin_df,
+        net_pin_df,
+        net_cell_df,
+        cell_cell_df,
+        edge_df,
+        fo4_df,
+    )
+
+
 if __name__ == "__main__":
     ### read tables ###
     (
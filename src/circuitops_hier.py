@@ -0,0 +1,49 @@
+import numpy as np
+
+from circuitops_helper import HIER_SEP_RE
+
+# unescaped "." and "/" both become SEP, which sorts before any name character,
+# so every module is one contiguous range of the sorted names
+SEP = "\x01"
+
+
+def canonical_name(name):
+    return HIER_SEP_RE.sub(SEP, name)
+
+
+### prefix index over hierarchical names: sorted canonical names + ids
+class HierIndex:
+    def __init__(self, names, ids):
+        keys = np.array([canonical_name(str(n)) for n in names], dtype=object)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.ids = np.asarray(ids)[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def range(self, path):
+        # [lo, hi) of the names under a module path such as "dpath.a_reg";
+        # escapes must be written as in the tables, e.g. "gen\[0\]"
+        if not path:
+            return 0, len(self.ids)
+        prefix = canonical_name(path.rstrip("./")) + SEP
+        lo = np.searchsorted(self.keys, prefix, side="left")
+        hi = np.searchsorted(self.keys, prefix + "\U0010ffff", side="left")
+        return int(lo), int(hi)
+
+    def query(self, path):
+        lo, hi = self.range(path)
+        return self.ids[lo:hi]
+
+    def children(self, path):
+        # immediate sub-modules of path with their name counts
+        lo, hi = self.range(path)
+        skip = len(canonical_name(path.rstrip("./"))) + 1 if path else 0
+        counts = {}
+        for key in self.keys[lo:hi]:
+            sep = key.find(SEP, skip)
+            if sep >= 0:
+                child = key[skip:sep]
+                counts[child] = counts.get(child, 0) + 1
+        return counts
@@ -0,0 +1,160 @@
+import argparse
+import multiprocessing as mp
+import os
+import pickle
+import time
+
+import numpy as np
+
+import circuitops_dataset as cod
+import circuitops_shm as cosh
+
+
+### feature columns of a model and the normalization it was trained with,
+### x -> (x - shift) / scale and predictions y -> y * scale + shift
+class FeatureSpec:
+    def __init__(
+        self, feature_cols=cod.STAGE_DELAY_FEATURES, x_scale=None, y_scale=None
+    ):
+        self.feature_cols = list(feature_cols)
+        self.x_scale = x_scale
+        self.y_scale = y_scale
+
+    @classmethod
+    def from_dataset(cls, path, normalize="standard", normalize_labels=False):
+        # same columns and train statistics as ShardReader(path, ...)
+        manifest = cod.read_manifest(path)
+        stats = manifest["stats"]
+        return cls(
+            manifest["feature_cols"],
+            cod.get_scale(stats["x"], normalize),
+            cod.get_scale(stats["y"], normalize if normalize_labels else None),
+        )
+
+
+def sink_features(sink_pin_info, spec):
+    # (sink pin ids, normalized features): one C-contiguous float32 matrix, so
+    # every batch is a row slice of it
+    x = np.ascontiguousarray(
+        sink_pin_info[spec.feature_cols].to_numpy(dtype=np.float32)
+    )
+    if spec.x_scale is not None:
+        x -= spec.x_scale[0]
+        x /= spec.x_scale[1]
+    return sink_pin_info["id"].to_numpy(dtype=np.int64), x
+
+
+def predict_batch(model, x, spec):
+    y = np.asarray(model.predict(x), dtype=float).reshape(len(x), -1)[:, 0]
+    if spec.y_scale is not None:
+        y = y * spec.y_scale[1][0] + spec.y_scale[0][0]
+    return y
+
+
+_worker_state = {}
+
+
+def _init_worker(handle, model, spec):
+    # model unpickled once per worker, features attached without a copy
+    shm, arrays = cosh.attach(handle)
+    _worker_state["shm"] = shm
+    _worker_state["x"] = arrays["x"]
+    _worker_state["model"] = model
+    _worker_state["spec"] = spec
+
+
+def _predict_worker(bounds):
+    lo, hi = bounds
+    x = _worker_state["x"]
+    return predict_batch(_worker_state["model"], x[lo:hi], _worker_state["spec"])
+
+
+### predictions of model for rows of x, batch_size rows at a time over a
+### process pool; x is published once to shared memory, only row ranges and
+### predictions are sent. num_workers <= 1 runs in this process
+def predict_rows(model, x, spec, batch_size=1 << 16, num_workers=None):
+    bounds = [(lo, min(lo + batch_size, len(x))) for lo in range(0, len(x), batch_size)]
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(bounds))
+    if num_workers <= 1:
+        parts = [predict_batch(model, x[lo:hi], spec) for lo, hi in bounds]
+    else:
+        with cosh.SharedBlock({}, {"x": x}) as block:
+            with mp.Pool(
+                num_workers,
+                initializer=_init_worker,
+                initargs=(block.handle, model, spec),
+            ) as pool:
+                parts = pool.map(_predict_worker, bounds)
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+### score every sink of a design and write the predictions back to the
+### manager as pin column col (NaN for all other pins). sink_pin_info, e.g.
+### from driver_sink_partitioned, is reused instead of being recomputed
+def predict_sinks(
+    com,
+    pin_pin_df,
+    model,
+    spec=None,
+    col="pred_stage_delay",
+    cell_cnt_th=200,
+    sink_pin_info=None,
+    batch_size=1 << 16,
+    num_workers=None,
+):
+    spec = spec or FeatureSpec()
+    start = time.time()
+    if sink_pin_info is None:
+        _, sink_pin_info = com.get_driver_sink_info_fast(
+            pin_pin_df, com.get_selected_pins(cell_cnt_th)
+        )
+    ids, x = sink_features(sink_pin_info, spec)
+    pred = predict_rows(model, x, spec, batch_size, num_workers)
+    com.set_pin_values(col, ids, pred)
+    print(f"Predicted {col} of {len(ids)} sinks in {time.time() - start:.2f}s")
+    return com.pin_df[["id", "name", col]].iloc[ids]
+
+
+def main():
+    from circuitops_batch import build_manager
+
+    parser = argparse.ArgumentParser(
+        description="Predict the stage delay of every sink of an IR directory"
+    )
+    parser.add_argument("data_root")
+    parser.add_argument("model", help="pickled fitted regressor")
+    parser.add_argument("-o", "--out", default=None, help="write predictions CSV")
+    parser.add_argument("--dataset", default=None, help="feature spec of a dataset")
+    parser.add_argument("--normalize", default="standard")
+    parser.add_argument("--normalize-labels", action="store_true")
+    parser.add_argument("--col", default="pred_stage_delay")
+    parser.add_argument("--cell-cnt-th", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=1 << 16)
+    parser.add_argument("--num-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    spec = None
+    if args.dataset:
+        normalize = None if args.normalize == "none" else args.normalize
+        spec = FeatureSpec.from_dataset(args.dataset, normalize, args.normalize_labels)
+    com, pin_pin_df = build_manager(args.data_root)
+    pred = predict_sinks(
+        com,
+        pin_pin_df,
+        model,
+        spec,
+        col=args.col,
+        cell_cnt_th=args.cell_cnt_th,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+    )
+    if args.out:
+        pred.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,33 @@
  # @ License under Apache-2.0 license
  """
 
+import threading
+
 import pandas as pd
 import networkx as nx
 import numpy as np
 
+import circuitops_helper as coh
+import circuitops_shm as cosh
+import circuitops_snapshot as cos
+from circuitops_arcs import PinArcStore
+from circuitops_corners import CELL_CORNER_COLS, PIN_CORNER_COLS, CornerStack
+from circuitops_hier import HierIndex
+from circuitops_partition import Partition, get_cut, refine_labels, tile_labels
+from circuitops_spatial import GridIndex
+from circuitops_timing import TimingSummary
+
+# RSMT / HPWL ratio by net pin count (Cheng, 1994); beyond 50 pins the ratio
+# keeps growing with sqrt(n)
+RSMT_PIN_CNT = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 15, 20, 25, 30, 35, 40, 45, 50]
+RSMT_FACTOR = [
+    1.0, 1.0, 1.0, 1.08, 1.15, 1.22, 1.28, 1.34, 1.40, 1.45,
+    1.69, 1.89, 2.07, 2.23, 2.39, 2.54, 2.66, 2.79,
+]  # fmt: skip
+
+# dataframes saved in snapshots, see save / load
+SNAPSHOT_FRAMES = ["_pin_df", "_cell_df", "_net_df", "_edge_df", "_fo4_df"]
+
 
 class CircuitOpsManager:
     def __init__(self, pin_df, cell_df, net_df, edge_df, fo4_df):
@@ -32,6 +55,13 @@ class CircuitOpsManager:
         self._edge_df = edge_df
         self._fo4_df = fo4_df
 
+        # derived structures, see _cached / _invalidate
+        self._cache = {}
+        # per-corner timing/power on the same topology, see init_corners
+        self._corners = None
+        # (meta, arrays) this manager was loaded from, see load
+        self._snapshot = None
+
         self.N_pin = len(pin_df["id"])
         self.N_cell = len(cell_df["id"])
         self.N_net = len(net_df["id"])
@@ -47,8 +77,7 @@ class CircuitOpsManager:
             self._co.add_node(i, type=2)  # net
 
         # Add edges
-        for edge in self._edge_df.values.tolist():
-            self._co.add_edge(int(edge[0]), int(edge[1]), type=int(edge[2]))
+        self.update_edges()
 
         self.update_fo4()
         self.update_pin_props()
@@ -57,6 +86,149 @@ class CircuitOpsManager:
 
         self.add_rel_ids()
 
+    def __getattr__(self, name):
+        # state of a loaded snapshot is only decoded on first use, once, also
+        # with several threads (e.g. circuitops_server)
+        lazy = self.__dict__.get("_lazy")
+        if lazy is None:
+            raise AttributeError(name)
+        with self.__dict__["_lazy_lock"]:
+            # decoded by another thread meanwhile
+            if name in self.__dict__:
+                return self.__dict__[name]
+            if name not in lazy:
+                raise AttributeError(name)
+            value = lazy[name]()
+            setattr(self, name, value)
+            del lazy[name]
+        return value
+
+    def __getstate__(self):
+        # pickled with everything decoded, as a plain manager; the lock, the
+        # shared memory handle and the source arrays stay with this process
+        for name in list(self.__dict__.get("_lazy") or {}):
+            getattr(self, name)
+        state = self.__dict__.copy()
+        for name in ["_lazy", "_lazy_lock", "_shm"]:
+            state.pop(name, None)
+        state["_snapshot"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _snapshot_arrays(self):
+        meta, arrays = {"frames": {}}, {}
+        for name in SNAPSHOT_FRAMES:
+            meta["frames"][name] = cos.frame_to_arrays(
+                getattr(self, name), name, arrays
+            )
+
+        lazy = self.__dict__.get("_lazy") or {}
+        if "_co" in lazy and self._snapshot is not None:
+            # graph never touched since load: copy its arrays as they are
+            src_meta, src_arrays = self._snapshot
+            meta["graph"] = src_meta["graph"]
+            arrays.update({k: v for k, v in src_arrays.items() if k.startswith("_co.")})
+        else:
+            meta["graph"] = cos.graph_to_arrays(self._co, "_co", arrays)
+
+        meta["corners"] = None
+        if self._corners is not None:
+            st = self._corners
+            meta["corners"] = st.names
+            for key in ["arc_src", "arc_tar", "arc_is_net", "arc_delay"]:
+                arrays[f"corners.{key}"] = getattr(st, key)
+            for col, values in list(st.pin.items()) + list(st.cell.items()):
+                arrays[f"corners.{col}"] = values
+        return meta, arrays
+
+    def save(self, path):
+        # Complete built state (tables, graph with node / edge attributes,
+        # corners) as a versioned directory of .npy arrays, see
+        # circuitops_snapshot; derived caches are rebuilt on demand
+        meta, arrays = self._snapshot_arrays()
+        meta.update(N_pin=self.N_pin, N_cell=self.N_cell, N_net=self.N_net)
+        cos.write_snapshot(path, meta, arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        # numeric columns are memory-mapped (copy-on-write, paged in on access)
+        # with mmap; tables and the graph are decoded on first use
+        meta, arrays = cos.read_snapshot(path, mmap=mmap)
+        return cls._from_arrays(meta, arrays)
+
+    def share(self):
+        # Publish tables, graph, corners and cached arrays (e.g. get_csr) to
+        # one shared memory block; workers call attach(block.handle). The
+        # caller owns the block and closes it once the workers are done.
+        # Everything is in the block in snapshot encoding: numeric columns,
+        # string columns as utf-8 blobs, the graph as src / tar / attribute
+        # arrays. Workers decode a table or the graph from the shared buffers
+        # on first use only, the decoded python objects (strings, networkx
+        # graph) are then held per worker; build the cached arrays workers
+        # need (get_csr, get_selected_mask) before sharing to skip the graph
+        meta, arrays = self._snapshot_arrays()
+        meta.update(N_pin=self.N_pin, N_cell=self.N_cell, N_net=self.N_net)
+        meta["cache"] = []
+        for i, (key, (deps, value)) in enumerate(self._cache.items()):
+            values = value if isinstance(value, tuple) else (value,)
+            if all(isinstance(v, np.ndarray) and v.dtype != object for v in values):
+                names = [f"cache.{i}.{j}" for j in range(len(values))]
+                arrays.update(zip(names, values))
+                meta["cache"].append((key, deps, names, isinstance(value, tuple)))
+        return cosh.SharedBlock(meta, arrays)
+
+    @classmethod
+    def attach(cls, handle):
+        # Read-only manager over a block published with share: numeric arrays
+        # are zero-copy views, string columns and the graph are decoded from
+        # the shared buffers (and held by this process) on first use
+        shm, arrays = cosh.attach(handle)
+        com = cls._from_arrays(handle["meta"], arrays)
+        com._shm = shm
+        for key, deps, names, is_tuple in handle["meta"]["cache"]:
+            value = tuple(arrays[n] for n in names)
+            com._cache[key] = (deps, value if is_tuple else value[0])
+        return com
+
+    @classmethod
+    def _from_arrays(cls, meta, arrays):
+        com = cls.__new__(cls)
+        com._cache = {}
+        com._snapshot = (meta, arrays)
+        com.N_pin, com.N_cell, com.N_net = meta["N_pin"], meta["N_cell"], meta["N_net"]
+        com.total_v_cnt = com.N_pin + com.N_cell + com.N_net
+
+        com._lazy_lock = threading.RLock()
+        com._lazy = {
+            name: (
+                lambda name=name: cos.frame_from_arrays(
+                    meta["frames"][name], name, arrays
+                )
+            )
+            for name in SNAPSHOT_FRAMES
+        }
+        com._lazy["_co"] = lambda: cos.graph_from_arrays(meta["graph"], "_co", arrays)
+
+        com._corners = None
+        if meta["corners"] is not None:
+            st = CornerStack(
+                com.N_pin,
+                com.N_cell,
+                arrays["corners.arc_src"],
+                arrays["corners.arc_tar"],
+                arrays["corners.arc_is_net"],
+            )
+            st.names = list(meta["corners"])
+            st.arc_delay = arrays["corners.arc_delay"]
+            for col in PIN_CORNER_COLS:
+                st.pin[col] = arrays[f"corners.{col}"]
+            for col in CELL_CORNER_COLS:
+                st.cell[col] = arrays[f"corners.{col}"]
+            com._corners = st
+        return com
+
     @property
     def fo4_df(self):
         return self._fo4_df
@@ -66,6 +238,7 @@ class CircuitOpsManager:
         if not isinstance(value, pd.DataFrame):
             raise ValueError("fo4_df must be a pandas DataFrame")
         self._fo4_df = value
+        self._invalidate("fo4")
 
     @property
     def pin_df(self):
@@ -76,6 +249,7 @@ class CircuitOpsManager:
         if not isinstance(value, pd.DataFrame):
             raise ValueError("pin_df must be a pandas DataFrame")
         self._pin_df = value
+        self._invalidate("pin")
 
     @property
     def cell_df(self):
@@ -86,6 +260,7 @@ class CircuitOpsManager:
         if not isinstance(value, pd.DataFrame):
             raise ValueError("cell_df must be a pandas DataFrame")
         self._cell_df = value
+        self._invalidate("cell")
 
     @property
     def net_df(self):
@@ -96,6 +271,7 @@ class CircuitOpsManager:
         if not isinstance(value, pd.DataFrame):
             raise ValueError("net_df must be a pandas DataFrame")
         self._net_df = value
+        self._invalidate("net")
 
     @property
     def edge_df(self):
@@ -106,6 +282,730 @@ class CircuitOpsManager:
         if not isinstance(value, pd.DataFrame):
             raise ValueError("edge_df must be a pandas DataFrame")
         self._edge_df = value
+        # the graph follows edge_df, so "edge" entries rebuild from new edges
+        self.update_edges()
+        self._invalidate("edge")
+
+    def update_edges(self):
+        # edges of _co from edge_df, node attributes are kept
+        self._co.remove_edges_from(list(self._co.edges))
+        for edge in self._edge_df.values.tolist():
+            self._co.add_edge(int(edge[0]), int(edge[1]), type=int(edge[2]))
+
+    def _cached(self, key, deps, fn):
+        # deps: which tables the entry is derived from, "pin", "cell", "net",
+        # "edge" or "fo4"; the entry is dropped when one of them is replaced
+        if key not in self._cache:
+            value = fn()
+            for x in value if isinstance(value, tuple) else (value,):
+                if isinstance(x, np.ndarray):
+                    x.setflags(write=False)
+            self._cache[key] = (frozenset(deps), value)
+        return self._cache[key][1]
+
+    def _invalidate(self, *deps):
+        for key in [k for k, (d, _) in self._cache.items() if d.intersection(deps)]:
+            del self._cache[key]
+
+    def clear_cache(self):
+        self._cache = {}
+
+    def get_edges(self, e_type):
+        # (src_id, tar_id) arrays of one edge type
+        # edge type: 0 pin_pin, 1 cell_pin, 2 net_pin, 3 net_cell, 4 cell_cell
+        def build():
+            e_ar = self._edge_df.loc[
+                self._edge_df["type"] == e_type, ["src_id", "tar_id"]
+            ].to_numpy(dtype=np.int64)
+            return np.ascontiguousarray(e_ar[:, 0]), np.ascontiguousarray(e_ar[:, 1])
+
+        return self._cached(("edges", e_type), {"edge"}, build)
+
+    def get_csr(self, e_types=(0,), reverse=False):
+        # CSR adjacency over all vertex ids, only with the given edge types
+        def build():
+            e_ar = [self.get_edges(t) for t in e_types]
+            src = np.concatenate([e[1] if reverse else e[0] for e in e_ar])
+            tar = np.concatenate([e[0] if reverse else e[1] for e in e_ar])
+
+            order = np.argsort(src, kind="stable")
+            indptr = np.zeros(self.total_v_cnt + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=self.total_v_cnt), out=indptr[1:])
+            return indptr, tar[order]
+
+        return self._cached(("csr", tuple(e_types), reverse), {"edge"}, build)
+
+    def get_cone(self, ids, direction="in", e_types=(0,), max_depth=None):
+        # fan-in ("in") or fan-out ("out") cone of vertex ids over the given
+        # edge types, level by level on the CSR: (vertex ids, depth)
+        if direction not in ("in", "out"):
+            raise ValueError("direction must be 'in' or 'out'")
+        indptr, indices = self.get_csr(e_types, reverse=direction == "in")
+        depth = np.full(self.total_v_cnt, -1, dtype=np.int64)
+        frontier = np.unique(np.asarray(ids, dtype=np.int64))
+        if len(frontier) and (frontier[0] < 0 or frontier[-1] >= self.total_v_cnt):
+            raise ValueError("vertex ids out of range")
+        depth[frontier] = 0
+        d = 0
+        while len(frontier) and (max_depth is None or d < max_depth):
+            start = indptr[frontier]
+            cnt = indptr[frontier + 1] - start
+            off = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            nbr = np.unique(indices[np.repeat(start, cnt) + off])
+            frontier = nbr[depth[nbr] < 0]
+            d += 1
+            depth[frontier] = d
+        found = np.flatnonzero(depth >= 0)
+        return found, depth[found]
+
+    def get_partition(self, n_parts, method="tile", n_iter=10, imbalance=0.05):
+        # Balanced parts of the design for per-part processing, see
+        # circuitops_partition: "tile" cuts the die into n_parts tiles of equal
+        # cell count, "mincut" refines the tiles by label propagation over
+        # cell_cell edges. Pins go with their cell, ports and macro pins are
+        # placed by their own location
+        if method not in ("tile", "mincut"):
+            raise ValueError("method must be 'tile' or 'mincut'")
+
+        def build():
+            pin_cell = self._pin_df["cell_id"].to_numpy().astype(np.int64)
+            free = np.flatnonzero(pin_cell < self.N_pin)
+            x = np.concatenate(
+                [self._cell_df["x"].to_numpy(), self._pin_df["x"].to_numpy()[free]]
+            )
+            y = np.concatenate(
+                [self._cell_df["y"].to_numpy(), self._pin_df["y"].to_numpy()[free]]
+            )
+            labels = tile_labels(x, y, n_parts)
+            src, tar = self.get_edges(4)
+            src, tar = src - self.N_pin, tar - self.N_pin
+            print(f"Tile partition: {n_parts} parts, cut {get_cut(labels, src, tar)}")
+            if method == "mincut":
+                labels = refine_labels(labels, src, tar, n_parts, n_iter, imbalance)
+                print(f"Refined partition: cut {get_cut(labels, src, tar)}")
+
+            cell_part = labels[: self.N_cell]
+            pin_part = np.empty(self.N_pin, dtype=np.int64)
+            has_cell = pin_cell >= self.N_pin
+            pin_part[has_cell] = cell_part[pin_cell[has_cell] - self.N_pin]
+            pin_part[free] = labels[self.N_cell :]
+            net_id = self._pin_df["net_id"].to_numpy(dtype=float)
+            pin_net = np.where(
+                np.isnan(net_id), -1, np.nan_to_num(net_id) - self.N_pin - self.N_cell
+            )
+            return Partition(
+                n_parts,
+                pin_part,
+                cell_part,
+                pin_net,
+                (self._pin_df["dir"] == 0).to_numpy(),
+                self.N_net,
+            )
+
+        return self._cached(
+            ("partition", n_parts, method, n_iter, imbalance),
+            {"pin", "cell", "edge"},
+            build,
+        )
+
+    def get_die_bounds(self):
+        def build():
+            x = np.concatenate(
+                [self._pin_df.x, self._cell_df.x0, self._cell_df.x1]
+            ).astype(float)
+            y = np.concatenate(
+                [self._pin_df.y, self._cell_df.y0, self._cell_df.y1]
+            ).astype(float)
+            return (np.nanmin(x), np.nanmin(y), np.nanmax(x), np.nanmax(y))
+
+        return self._cached("die_bounds", {"pin", "cell"}, build)
+
+    def get_spatial_index(self, kind="pin", bin_size=None):
+        # pin and cell indexes share the die bounds and the default bin size,
+        # so their per-bin aggregates line up
+        if kind not in ("pin", "cell"):
+            raise ValueError("kind must be 'pin' or 'cell'")
+        bounds = self.get_die_bounds()
+        if bin_size is None:
+            area = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+            bin_size = np.sqrt(4 * max(area, 1.0) / max(self.N_cell, 1))
+        df = self._pin_df if kind == "pin" else self._cell_df
+
+        return self._cached(
+            ("spatial", kind, bin_size),
+            {"pin", "cell"},
+            lambda: GridIndex(df.x, df.y, df.id, bin_size=bin_size, bounds=bounds),
+        )
+
+    def get_bin_aggregates(self, bin_size=None):
+        # per-bin grids over the die, shape (ny, nx)
+        pins = self.get_spatial_index("pin", bin_size)
+        cells = self.get_spatial_index("cell", bin_size)
+        area = (self._cell_df.x1 - self._cell_df.x0) * (
+            self._cell_df.y1 - self._cell_df.y0
+        )
+        return {
+            "pin_count": pins.aggregate(),
+            "cell_count": cells.aggregate(),
+            "cell_area": cells.aggregate(area),
+            "staticpower": cells.aggregate(self._cell_df.staticpower),
+            "dynamicpower": cells.aggregate(self._cell_df.dynamicpower),
+        }
+
+    def get_bin_features(self, x, y, bin_size=None):
+        # per-bin aggregates at every query location
+        cells = self.get_spatial_index("cell", bin_size)
+        grids = self.get_bin_aggregates(bin_size)
+        return {name: cells.lookup(grid, x, y) for name, grid in grids.items()}
+
+    def get_net_geometry(self, update_steiner=False):
+        # Per-net pin bounding box, HPWL and a rectilinear Steiner estimate,
+        # and per-pin Manhattan distance to the driver of its net; with
+        # update_steiner, missing net_steiner_length values are filled from
+        # the estimate (see update_net_steiner_length)
+        net_id = self._pin_df["net_id"].to_numpy(dtype=float)
+        rows = np.flatnonzero(~np.isnan(net_id))
+        order, start, keys = coh.get_segments(net_id[rows])
+        rows = rows[order]
+
+        x = self._pin_df["x"].to_numpy(dtype=float)
+        y = self._pin_df["y"].to_numpy(dtype=float)
+        x_stats = coh.segment_agg(x[rows], start, ["count", "min", "max"])
+        y_stats = coh.segment_agg(y[rows], start, ["min", "max"])
+        n_pins = np.diff(np.r_[start, len(rows)])
+        hpwl = (x_stats["max"] - x_stats["min"]) + (y_stats["max"] - y_stats["min"])
+        steiner = hpwl * np.where(
+            n_pins <= RSMT_PIN_CNT[-1],
+            np.interp(n_pins, RSMT_PIN_CNT, RSMT_FACTOR),
+            RSMT_FACTOR[-1] * np.sqrt(n_pins / RSMT_PIN_CNT[-1]),
+        )
+
+        # first driver pin (dir == 0) of every net
+        is_drv = (self._pin_df["dir"] == 0).to_numpy()
+        drv = rows[is_drv[rows]]
+        drv_net = net_id[drv]
+        first = np.r_[True, drv_net[1:] != drv_net[:-1]]
+        drv, drv_net = drv[first], drv_net[first]
+        seg_drv = np.full(len(keys), -1, dtype=np.int64)
+        seg_drv[self.lookup_idx(keys, drv_net)] = drv
+
+        seg = np.repeat(np.arange(len(keys)), n_pins)
+        d_row = seg_drv[seg]
+        has_drv = d_row >= 0
+        dist = np.full(len(rows), np.nan)
+        dist[has_drv] = np.abs(x[rows][has_drv] - x[d_row[has_drv]]) + np.abs(
+            y[rows][has_drv] - y[d_row[has_drv]]
+        )
+        dist[is_drv[rows]] = np.nan
+        pin_dist = np.full(self.N_pin, np.nan)
+        pin_dist[rows] = dist
+        sink_stats = coh.segment_agg(dist, start, ["mean", "max"])
+
+        net_geom = pd.DataFrame(
+            {
+                "net_id": keys.astype(np.int64),
+                "num_pins": n_pins,
+                "x_min": x_stats["min"],
+                "y_min": y_stats["min"],
+                "x_max": x_stats["max"],
+                "y_max": y_stats["max"],
+                "hpwl": hpwl,
+                "steiner_est": steiner,
+                "driver_pin_id": seg_drv,
+                "driver_sink_dist_mean": sink_stats["mean"],
+                "driver_sink_dist_max": sink_stats["max"],
+            }
+        )
+
+        if update_steiner:
+            self.update_net_steiner_length(net_geom)
+
+        return net_geom, pin_dist
+
+    def get_elmore_delay(self, sink_pin_info, scale=1.0):
+        # Elmore delay of every driver->sink pair in sink_pin_info (output of
+        # get_driver_sink_info), in the unit of net_res * net_cap. Each sink
+        # sees a uniform RC line of its Manhattan distance to the driver:
+        #   r_path * (c_path / 2 + sink cap)
+        # with r_path, c_path the share of net_res, net_cap by wire length
+        n_idx = self.lookup_idx(
+            self._net_df["id"].to_numpy(), sink_pin_info["net_id"].to_numpy()
+        )
+        hit = n_idx >= 0
+
+        def net_col(name):
+            values = np.full(len(n_idx), np.nan)
+            values[hit] = self._net_df[name].to_numpy(dtype=float)[n_idx[hit]]
+            return values
+
+        # wire length: routed, else Steiner estimate, else the sink distance
+        length = net_col("net_route_length")
+        steiner = net_col("net_steiner_length")
+        length = np.where(length > 0, length, steiner)
+
+        dist = np.abs(sink_pin_info["x"].to_numpy(dtype=float)) + np.abs(
+            sink_pin_info["y"].to_numpy(dtype=float)
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(length > 0, np.minimum(dist / length, 1.0), 1.0)
+        r_path = net_col("net_res") * frac
+        c_path = net_col("net_cap") * frac
+        cap = np.nan_to_num(sink_pin_info["cap"].to_numpy(dtype=float))
+
+        return scale * r_path * (0.5 * c_path + cap)
+
+    def get_pin_arcs(self, pin_pin_df):
+        # compact pin_pin arcs, cell arcs shared per libcell, see PinArcStore
+        return PinArcStore(pin_pin_df, self._pin_df, self._cell_df)
+
+    def get_clock_tree(self, pin_pin_df):
+        # Clock subgraph: pin_pin arcs between pins flagged is_in_clk, walked
+        # level by level from the roots (clock pins without clock fan-in).
+        # Returns per-sink (clock leaf pin) insertion delay, STA latency and
+        # depth, and skew statistics per clock root
+        is_clk = self._pin_df["is_in_clk"].fillna(0).to_numpy() == 1
+        src = pin_pin_df["src_id"].to_numpy(dtype=np.int64)
+        tar = pin_pin_df["tar_id"].to_numpy(dtype=np.int64)
+        e_mask = is_clk[src] & is_clk[tar]
+        src, tar = src[e_mask], tar[e_mask]
+        delay = np.nan_to_num(pin_pin_df["arc_delay"].to_numpy(dtype=float)[e_mask])
+        is_cell_arc = pin_pin_df["is_net"].to_numpy()[e_mask] == 0
+
+        order = np.argsort(src, kind="stable")
+        src, tar, delay, is_cell_arc = (
+            src[order],
+            tar[order],
+            delay[order],
+            is_cell_arc[order],
+        )
+        indptr = np.zeros(self.N_pin + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.N_pin), out=indptr[1:])
+        indeg = np.bincount(tar, minlength=self.N_pin)
+
+        clk_pins = np.flatnonzero(is_clk)
+        roots = clk_pins[indeg[clk_pins] == 0]
+        insertion = np.full(self.N_pin, np.nan)
+        depth = np.full(self.N_pin, -1, dtype=np.int64)
+        level = np.full(self.N_pin, -1, dtype=np.int64)
+        root = np.full(self.N_pin, -1, dtype=np.int64)
+        insertion[roots] = 0.0
+        depth[roots] = 0
+        level[roots] = 0
+        root[roots] = roots
+
+        # a pin is final once all its clock fan-in arcs are done; with
+        # reconvergence the latest arrival and the deepest path are kept
+        frontier = roots
+        n_level = 0
+        while len(frontier):
+            cnt = indptr[frontier + 1] - indptr[frontier]
+            e = np.repeat(indptr[frontier], cnt) + (
+                np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            )
+            u, v = src[e], tar[e]
+            first = np.isnan(insertion[v])
+            insertion[v[first]] = -np.inf
+            np.maximum.at(insertion, v, insertion[u] + delay[e])
+            np.maximum.at(depth, v, depth[u] + is_cell_arc[e])
+            np.maximum.at(root, v, root[u])
+            n_level += 1
+            level[v] = n_level
+
+            np.subtract.at(indeg, v, 1)
+            frontier = np.unique(v[indeg[v] == 0])
+
+        unreached = clk_pins[level[clk_pins] < 0]
+        if len(unreached):
+            print(f"Clock pins not reached (loop?): {len(unreached)}")
+
+        # sinks: reached clock pins without clock fan-out
+        out_deg = np.diff(indptr)
+        sinks = clk_pins[(out_deg[clk_pins] == 0) & (level[clk_pins] >= 0)]
+        latency = np.fmax(
+            self._pin_df["risearr"].to_numpy(dtype=float)[sinks],
+            self._pin_df["fallarr"].to_numpy(dtype=float)[sinks],
+        )
+        clk_sink_df = pd.DataFrame(
+            {
+                "id": sinks,
+                "root_id": root[sinks],
+                "insertion_delay": insertion[sinks],
+                "latency": latency,
+                "depth": depth[sinks],
+                "level": level[sinks],
+                "is_seq": self._pin_df["is_seq"].to_numpy()[sinks] == 1,
+            }
+        )
+
+        # skew statistics per clock root, over sequential sinks
+        seq = clk_sink_df[clk_sink_df.is_seq]
+        order, start, keys = coh.get_segments(seq["root_id"].to_numpy())
+        stats = {"root_id": keys, "num_sinks": np.diff(np.r_[start, len(order)])}
+        for name in ["insertion_delay", "latency"]:
+            agg = coh.segment_agg(
+                seq[name].to_numpy()[order], start, ["min", "max", "mean", "std"]
+            )
+            for how, values in agg.items():
+                stats[f"{name}_{how}"] = values
+            stats[f"{name}_skew"] = agg["max"] - agg["min"]
+        stats["depth_max"] = coh.segment_agg(
+            seq["depth"].to_numpy()[order].astype(float), start, ["max"]
+        )["max"]
+        clk_root_df = pd.DataFrame(stats)
+
+        print(
+            f"Clock roots: {len(roots)}, clock sinks: {len(sinks)}, levels: {n_level}"
+        )
+        return clk_sink_df, clk_root_df
+
+    def get_timing_summary(
+        self, by="all", pin_pin_df=None, depth=1, region_size=None, bins=50
+    ):
+        # Endpoint (is_end) slack metrics per group, by:
+        #   "all", "clock" (clock root of the endpoint cell, needs pin_pin_df,
+        #   cached per pin_pin_df arcs), "region" (die tiles of region_size,
+        #   8x8 by default) or "hierarchy" (module path of the endpoint cell
+        #   up to depth)
+        def build():
+            ends = np.flatnonzero(self._pin_df["is_end"].to_numpy() == 1)
+            if by == "all":
+                group, names = np.zeros(len(ends), dtype=np.int64), ["all"]
+            elif by == "clock":
+                if pin_pin_df is None:
+                    raise ValueError("pin_pin_df is required to group by clock")
+                clk_sink_df, _ = self.get_clock_tree(pin_pin_df)
+                clk_sink_df = clk_sink_df[clk_sink_df.is_seq]
+                cell_root = pd.Series(
+                    clk_sink_df["root_id"].to_numpy(),
+                    index=self._pin_df["cell_id"].to_numpy()[clk_sink_df["id"]],
+                )
+                cell_root = cell_root[~cell_root.index.duplicated()]
+                root = cell_root.reindex(self._pin_df["cell_id"].to_numpy()[ends])
+                group, names = pd.factorize(root.fillna(-1).astype(np.int64))
+                names = [
+                    self._pin_df["name"].iloc[r] if r >= 0 else "unclocked"
+                    for r in names
+                ]
+            elif by == "region":
+                size = region_size
+                if size is None:
+                    x0, y0, x1, y1 = self.get_die_bounds()
+                    size = max(x1 - x0, y1 - y0) / 8
+                grid = self.get_spatial_index("pin", size)
+                bx, by_ = grid.bin_xy(
+                    self._pin_df["x"].to_numpy()[ends],
+                    self._pin_df["y"].to_numpy()[ends],
+                )
+                group, names = pd.factorize(by_ * grid.nx + bx)
+                names = [f"x{b % grid.nx}_y{b // grid.nx}" for b in names]
+            elif by == "hierarchy":
+                cellname = self._pin_df["cellname"].fillna("").to_numpy()[ends]
+                group, names = pd.factorize(coh.get_hier_path(cellname, depth))
+            else:
+                raise ValueError(f"Unsupported timing summary group: {by}")
+
+            return TimingSummary(
+                ends,
+                self._pin_df["slack"].to_numpy(dtype=float)[ends],
+                group,
+                names,
+                bins=bins,
+            )
+
+        arcs = None
+        if by == "clock" and pin_pin_df is not None:
+            arcs = self.get_fingerprint(pin_pin_df)
+        return self._cached(
+            ("timing_summary", by, depth, region_size, bins, arcs),
+            {"pin", "cell", "edge"},
+            build,
+        )
+
+    def update_slack(self, ids, slack):
+        # new slack for pins ids; cached timing summaries only redo the
+        # changed endpoints
+        ids = np.asarray(ids, dtype=np.int64)
+        slack = np.asarray(slack, dtype=float)
+        self._pin_df.loc[self._pin_df.index[ids], "slack"] = slack
+        for i, value in zip(ids.tolist(), slack.tolist()):
+            self._co.nodes[i]["slack"] = value
+        for _, value in self._cache.values():
+            if isinstance(value, TimingSummary):
+                value.update(ids, slack)
+
+    def set_pin_values(self, col, ids, values):
+        # per-pin column (e.g. model predictions) with values for pins ids and
+        # NaN elsewhere; no topology changes, so nothing cached is invalidated
+        out = np.full(self.N_pin, np.nan)
+        out[np.asarray(ids, dtype=np.int64)] = values
+        self._pin_df[col] = out
+
+    def get_fingerprint(self, pin_pin_df=None):
+        # see coh.topology_fingerprint, with the arcs of pin_pin_df if given
+        if pin_pin_df is None:
+            return self._cached(
+                "fingerprint", {"pin"}, lambda: coh.topology_fingerprint(self._pin_df)
+            )
+        return coh.topology_fingerprint(
+            self._pin_df, pin_pin_df["src_id"], pin_pin_df["tar_id"]
+        )
+
+    def refresh_timing(self, pin_df, pin_pin_df=None, new_pin_pin_df=None):
+        # New STA results of the same netlist without a rebuild: pin_df and
+        # new_pin_pin_df are fresh pin / pin_pin tables (OpenROAD or renamed
+        # columns), pin_pin_df is the pin_pin table in use (with src_id /
+        # tar_id). Only changed values are written, slack / arrivals / tran to
+        # the pin table and the pin nodes, arc_delay to pin_pin_df. Cached
+        # timing summaries are updated incrementally, the other derived
+        # results only depend on the topology and are kept. With corners,
+        # the first corner (the one init_corners built from these tables)
+        # gets the same values
+        pin_df = pin_df.rename(columns=coh.PIN_RENAME)
+        if (
+            len(pin_df) != self.N_pin
+            or coh.topology_fingerprint(pin_df) != self.get_fingerprint()
+        ):
+            raise ValueError("pin_df does not match the topology of this design")
+
+        arc_delay = None
+        if new_pin_pin_df is not None:
+            if pin_pin_df is None:
+                raise ValueError("pin_pin_df is required to refresh arc delays")
+            # arcs of unknown pins are dropped, as in coh.resolve_edge_ids
+            name_idx = pd.Index(self._pin_df["name"])
+            src = name_idx.get_indexer(new_pin_pin_df["src"])
+            tar = name_idx.get_indexer(new_pin_pin_df["tar"])
+            ok = (src >= 0) & (tar >= 0)
+            pin_id = self._pin_df["id"].to_numpy()
+            if coh.topology_fingerprint(
+                pin_df, pin_id[src[ok]], pin_id[tar[ok]]
+            ) != self.get_fingerprint(pin_pin_df):
+                raise ValueError("new_pin_pin_df does not match the arcs of pin_pin_df")
+            arc_delay = new_pin_pin_df["arc_delay"].to_numpy(dtype=float)[ok]
+
+        def changed_rows(old, new):
+            return np.flatnonzero(~((old == new) | (np.isnan(old) & np.isnan(new))))
+
+        n_changed = {}
+        for col in PIN_CORNER_COLS:
+            new = pin_df[col].to_numpy(dtype=float)
+            rows = changed_rows(self._pin_df[col].to_numpy(dtype=float), new)
+            n_changed[col] = len(rows)
+            if self._corners is not None:
+                self._corners.update(0, col, rows, new[rows])
+            if col == "slack":
+                self.update_slack(rows, new[rows])
+                continue
+            self._pin_df.iloc[rows, self._pin_df.columns.get_loc(col)] = new[rows]
+            for i, value in zip(rows.tolist(), new[rows]):
+                self._co.nodes[i][col] = value
+
+        if arc_delay is not None:
+            rows = changed_rows(
+                pin_pin_df["arc_delay"].to_numpy(dtype=float), arc_delay
+            )
+            n_changed["arc_delay"] = len(rows)
+            if self._corners is not None:
+                slot = self._corners.arc_slots(
+                    pin_pin_df["src_id"].to_numpy()[rows],
+                    pin_pin_df["tar_id"].to_numpy()[rows],
+                )
+                self._corners.update(
+                    0, "arc_delay", slot[slot >= 0], arc_delay[rows][slot >= 0]
+                )
+            pin_pin_df.iloc[rows, pin_pin_df.columns.get_loc("arc_delay")] = arc_delay[
+                rows
+            ]
+
+        print(f"Refreshed timing: {n_changed}")
+        return n_changed
+
+    def init_corners(self, pin_pin_df, name="default"):
+        # Corner stack over the arcs of pin_pin_df, with the current pin/cell
+        # values as the first corner
+        self._corners = CornerStack(
+            self.N_pin,
+            self.N_cell,
+            pin_pin_df["src_id"].to_numpy(),
+            pin_pin_df["tar_id"].to_numpy(),
+            pin_pin_df["is_net"].to_numpy(),
+        )
+        self._corners.add(
+            name,
+            {c: self._pin_df[c].to_numpy(dtype=float) for c in PIN_CORNER_COLS},
+            {c: self._cell_df[c].to_numpy(dtype=float) for c in CELL_CORNER_COLS},
+            pin_pin_df["arc_delay"].to_numpy(dtype=float),
+        )
+        return self._corners
+
+    def get_corners(self):
+        if self._corners is None:
+            raise ValueError("No corners, call init_corners first")
+        return self._corners
+
+    def add_corner(self, name, pin_df, cell_df=None, pin_pin_df=None):
+        # Another corner from its own tables (see coh.read_corner_tables_OpenROAD),
+        # matched to this design by pin / cell names; values of pins, cells or
+        # arcs the corner does not have are NaN
+        corners = self.get_corners()
+        pin_idx = pd.Index(pin_df["name"]).get_indexer(self._pin_df["name"])
+        pin_values = {
+            c: self.take_idx(pin_df[c].to_numpy(dtype=float), pin_idx, upcast=True)
+            for c in PIN_CORNER_COLS
+        }
+
+        cell_values = {c: np.full(self.N_cell, np.nan) for c in CELL_CORNER_COLS}
+        if cell_df is not None:
+            cell_idx = pd.Index(cell_df["name"]).get_indexer(self._cell_df["name"])
+            for c in CELL_CORNER_COLS:
+                cell_values[c] = self.take_idx(
+                    cell_df[c].to_numpy(dtype=float), cell_idx, upcast=True
+                )
+
+        arc_delay = np.full(len(corners.arc_src), np.nan)
+        if pin_pin_df is not None:
+            name_idx = pd.Index(self._pin_df["name"])
+            src = name_idx.get_indexer(pin_pin_df["src"])
+            tar = name_idx.get_indexer(pin_pin_df["tar"])
+            ok = (src >= 0) & (tar >= 0)
+            pin_id = self._pin_df["id"].to_numpy()
+            slot = np.full(len(pin_pin_df), -1, dtype=np.int64)
+            slot[ok] = corners.arc_slots(pin_id[src[ok]], pin_id[tar[ok]])
+            delay = pin_pin_df["arc_delay"].to_numpy(dtype=float)
+            arc_delay[slot[slot >= 0]] = delay[slot >= 0]
+
+        corners.add(name, pin_values, cell_values, arc_delay)
+        return corners
+
+    def get_worst_corner(self, col="slack", how="min"):
+        # worst value of a corner column across corners per pin (or cell) and
+        # the corner it comes from
+        corners = self.get_corners()
+        value, corner = corners.reduce(col, how)
+        ids = (
+            self._pin_df["id"].to_numpy()
+            if col in PIN_CORNER_COLS
+            else self._cell_df["id"].to_numpy()
+        )
+        if col == "arc_delay":
+            return pd.DataFrame(
+                {
+                    "src_id": corners.arc_src,
+                    "tar_id": corners.arc_tar,
+                    col: value,
+                    "corner": np.append(corners.names, None)[corner],
+                }
+            )
+        return pd.DataFrame(
+            {"id": ids, col: value, "corner": np.append(corners.names, None)[corner]}
+        )
+
+    def get_corner_stage_delay(self, sink_pin_info):
+        # per-corner stage delay of driver -> sink rows (e.g. from
+        # get_driver_sink_info_fast): max cell arc delay into the driver pin
+        # plus max net arc delay into the sink pin, one column per corner;
+        # NaN without a driver cell arc in the corner (such rows are dropped
+        # from get_driver_sink_info_fast), rows stay aligned with the input
+        corners = self.get_corners()
+        drv = sink_pin_info["driver_pin_id"].to_numpy(dtype=np.int64)
+        snk = sink_pin_info["id"].to_numpy(dtype=np.int64)
+        cell_arc = corners.arc_max_by_tar(False)[:, drv]
+        net_arc = corners.arc_max_by_tar(True)[:, snk]
+        stage = cell_arc + net_arc
+        out = pd.DataFrame({"driver_pin_id": drv, "id": snk})
+        for c, name in enumerate(corners.names):
+            out[name] = stage[c]
+        return out
+
+    def get_hier_index(self, kind="cell"):
+        if kind not in ("pin", "cell"):
+            raise ValueError("kind must be 'pin' or 'cell'")
+        df = self._pin_df if kind == "pin" else self._cell_df
+        return self._cached(
+            ("hier_index", kind), {kind}, lambda: HierIndex(df["name"], df["id"])
+        )
+
+    def get_module_stats(self, path):
+        # cell count, area, power and worst pin slack under a module path
+        cell_ids = self.get_hier_index("cell").query(path)
+        rows = self.lookup_idx(self._cell_df["id"].to_numpy(), np.sort(cell_ids))
+        cells = self._cell_df.iloc[rows[rows >= 0]]
+        # pins follow their cell as in get_module_table, ports are left out
+        in_module = np.isin(self._pin_df["cell_id"].to_numpy(), cells["id"].to_numpy())
+        pin_ids = self._pin_df["id"].to_numpy()[in_module]
+        slack = self._pin_df["slack"].to_numpy(dtype=float)[in_module]
+        slack = slack[np.isfinite(slack)]
+        return {
+            "num_cells": len(cells),
+            "num_pins": len(pin_ids),
+            "area": ((cells.x1 - cells.x0) * (cells.y1 - cells.y0)).sum(),
+            "staticpower": cells.staticpower.sum(),
+            "dynamicpower": cells.dynamicpower.sum(),
+            "worst_slack": slack.min() if len(slack) else np.nan,
+        }
+
+    def get_module_table(self, depth=1):
+        # get_module_stats for every module path cut at depth
+        cell_module, modules = pd.factorize(
+            coh.get_hier_path(self._cell_df["name"].astype(str), depth)
+        )
+        n = len(modules)
+        area = (self._cell_df.x1 - self._cell_df.x0) * (
+            self._cell_df.y1 - self._cell_df.y0
+        )
+
+        # pins follow their cell, ports are left out
+        pin_rows = self.lookup_idx(
+            self._cell_df["id"].to_numpy(), self._pin_df["cell_id"].to_numpy()
+        )
+        has_cell = pin_rows >= 0
+        pin_module = cell_module[pin_rows[has_cell]]
+        slack = self._pin_df["slack"].to_numpy(dtype=float)[has_cell]
+        finite = np.isfinite(slack)
+        worst_slack = np.full(n, np.inf)
+        np.minimum.at(worst_slack, pin_module[finite], slack[finite])
+
+        return pd.DataFrame(
+            {
+                "module": modules,
+                "num_cells": np.bincount(cell_module, minlength=n),
+                "num_pins": np.bincount(pin_module, minlength=n),
+                "area": np.bincount(cell_module, weights=area, minlength=n),
+                "staticpower": np.bincount(
+                    cell_module,
+                    weights=self._cell_df.staticpower.fillna(0),
+                    minlength=n,
+                ),
+                "dynamicpower": np.bincount(
+                    cell_module,
+                    weights=self._cell_df.dynamicpower.fillna(0),
+                    minlength=n,
+                ),
+                "worst_slack": np.where(np.isinf(worst_slack), np.nan, worst_slack),
+            }
+        )
+
+    def update_net_steiner_length(self, net_geom):
+        # fill net_steiner_length where the tables have no value (-1)
+        n_idx = self.lookup_idx(
+            self._net_df["id"].to_numpy(), net_geom["net_id"].to_numpy()
+        )
+        hit = n_idx >= 0
+        n_idx = n_idx[hit]
+        steiner = net_geom["steiner_est"].to_numpy()[hit]
+
+        old = self._net_df["net_steiner_length"].to_numpy(dtype=float)
+        missing = np.isnan(old[n_idx]) | (old[n_idx] < 0)
+        n_idx, steiner = n_idx[missing], steiner[missing]
+        self._net_df["net_steiner_length"] = old
+        self._net_df.loc[self._net_df.index[n_idx], "net_steiner_length"] = steiner
+        nx.set_node_attributes(
+            self._co,
+            dict(zip(self._net_df["id"].to_numpy()[n_idx].tolist(), steiner)),
+            "net_steiner_length",
+        )
+        self._invalidate("net")
+        print(f"Filled net_steiner_length: {len(n_idx)}")
 
     def get_largest_idx(self, hist):
         largest_idx = -1
@@ -133,25 +1033,59 @@ class CircuitOpsManager:
 
         return sub_g
 
-    def get_pin_pin_subgraph(self, cell_cnt_th=200):
-        g_pp = self._co.subgraph(
-            [n for n, d in self._co.nodes(data=True) if d["type"] == 0]
+    def get_pin_graph(self):
+        return self._cached(
+            "pin_graph",
+            {"edge"},
+            lambda: self._co.subgraph(
+                [n for n, d in self._co.nodes(data=True) if d["type"] == 0]
+            ),
+        )
+
+    def get_pin_components(self):
+        return self._cached(
+            "pin_components",
+            {"edge"},
+            lambda: list(nx.connected_components(self.get_pin_graph().to_undirected())),
         )
-        comp = list(nx.connected_components(g_pp.to_undirected()))
-        hist = [len(c) for c in comp]
-        labels = self.get_large_components(hist, th=cell_cnt_th)
-        v_valid_pins = {n for l in labels for n in comp[l]}
+
+    def get_valid_pins(self, cell_cnt_th=200):
+        def build():
+            comp = self.get_pin_components()
+            hist = [len(c) for c in comp]
+            labels = self.get_large_components(hist, th=cell_cnt_th)
+            return {n for l in labels for n in comp[l]}
+
+        return self._cached(("valid_pins", cell_cnt_th), {"edge"}, build)
+
+    def get_pin_pin_subgraph(self, cell_cnt_th=200):
+        v_valid_pins = self.get_valid_pins(cell_cnt_th)
 
         nx.set_node_attributes(self._co, v_valid_pins, "valid_pins")
         print(f"Valid pins: {len(v_valid_pins)}")
 
-        e_label = [
-            (u, v)
-            for u, v, d in g_pp.edges(data=True)
-            if u in v_valid_pins and v in v_valid_pins
-        ]
+        def build():
+            g_pp = self.get_pin_graph()
+            e_label = [
+                (u, v)
+                for u, v, d in g_pp.edges(data=True)
+                if u in v_valid_pins and v in v_valid_pins
+            ]
+            return self.get_subgraph(g_pp, v_valid_pins, e_label)
 
-        return self.get_subgraph(g_pp, v_valid_pins, e_label)
+        return self._cached(("pin_pin_subgraph", cell_cnt_th), {"edge"}, build)
+
+    def get_selected_mask(self, cell_cnt_th=200):
+        # pin_df rows flagged by the valid_pins node attribute
+        def build():
+            nx.set_node_attributes(
+                self._co, self.get_valid_pins(cell_cnt_th), "valid_pins"
+            )
+            return self._pin_df.index.isin(
+                [n for n, d in self._co.nodes(data=True) if d.get("valid_pins", False)]
+            )
+
+        return self._cached(("selected", cell_cnt_th), {"edge", "pin"}, build)
 
     def add_rel_ids(self):
         cell_temp = self._cell_df.loc[:, ["name", "id"]]
@@ -303,9 +1237,7 @@ class CircuitOpsManager:
     def generate_buffer_tree(self):
         sub_g_pp = self.get_pin_pin_subgraph()
 
-        self._pin_df["selected"] = self._pin_df.index.isin(
-            [n for n, d in self._co.nodes(data=True) if d.get("valid_pins", False)]
-        )
+        self._pin_df["selected"] = self.get_selected_mask().copy()
 
         # Get buffer tree start and end points
         v_bt_s = {n: False for n in self._co.nodes}
@@ -504,11 +1436,9 @@ class CircuitOpsManager:
 
         return u_cell_g
 
-    def get_selected_pins(self):
-        self.get_pin_pin_subgraph()
-        self._pin_df["selected"] = self._pin_df.index.isin(
-            [n for n, d in self._co.nodes(data=True) if d.get("valid_pins", False)]
-        )
+    def get_selected_pins(self, cell_cnt_th=200):
+        self.get_pin_pin_subgraph(cell_cnt_th)
+        self._pin_df["selected"] = self.get_selected_mask(cell_cnt_th).copy()
         return self._pin_df[
             (self._pin_df.selected == True)
             & (self._pin_df.is_buf == False)
@@ -621,3 +1551,152 @@ class CircuitOpsManager:
         sink_pin_info["net_delay"] = sink_pin_info["net_delay_max"]
 
         return driver_pin_info, sink_pin_info
+
+    @staticmethod
+    def left_join_idx(left_key, right_key):
+        # row pairs of a pandas left merge on one key, from sorted right keys;
+        # unmatched left rows get right index -1, NaN keys match each other
+        r_order = np.argsort(right_key, kind="stable")
+        r_sorted = right_key[r_order]
+        lo = np.searchsorted(r_sorted, left_key, side="left")
+        hi = np.searchsorted(r_sorted, left_key, side="right")
+        hit = hi > lo
+        cnt = np.where(hit, hi - lo, 1)
+
+        left_idx = np.repeat(np.arange(len(left_key)), cnt)
+        off = np.arange(len(left_idx)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        right_idx = np.full(len(left_idx), -1, dtype=np.int64)
+        mask = np.repeat(hit, cnt)
+        right_idx[mask] = r_order[(np.repeat(lo, cnt) + off)[mask]]
+        return left_idx, right_idx
+
+    @staticmethod
+    def lookup_idx(keys, query):
+        # position of query in sorted unique keys, -1 if missing
+        pos = np.searchsorted(keys, query)
+        pos_c = np.minimum(pos, max(len(keys) - 1, 0))
+        hit = (pos < len(keys)) & (keys[pos_c] == query) if len(keys) else pos < 0
+        return np.where(hit, pos_c, -1)
+
+    @staticmethod
+    def take_idx(values, idx, upcast=None):
+        # gather values with -1 as missing; like a pandas left merge, the column
+        # becomes float once any row was unmatched
+        if upcast is None:
+            upcast = (idx < 0).any()
+        if not upcast:
+            return values[idx]
+        out = np.full(len(idx), np.nan)
+        mask = idx >= 0
+        out[mask] = values[idx[mask]]
+        return out
+
+    def get_driver_sink_info_fast(self, pin_pin_df, selected_pin_df):
+        # Same outputs as get_driver_sink_info, but the joins go through sorted
+        # net_id / pin id arrays and the statistics through segment reductions,
+        # so only the needed columns are ever materialized for the sink rows
+        is_drv = (selected_pin_df.dir == 0).to_numpy()
+        is_snk = (selected_pin_df.dir == 1).to_numpy()
+
+        def col(name, mask):
+            return selected_pin_df[name].to_numpy()[mask]
+
+        # Driver pins joined with driver cell info
+        drv_cell = col("cell_id", is_drv)
+        d_idx, c_idx = self.left_join_idx(drv_cell, self._cell_df["id"].to_numpy())
+        c_miss = (c_idx < 0).any()
+        driver = {
+            "driver_pin_id": col("id", is_drv)[d_idx],
+            "net_id": col("net_id", is_drv)[d_idx],
+            "driver_x": col("x", is_drv)[d_idx],
+            "driver_y": col("y", is_drv)[d_idx],
+            "driver_id": drv_cell[d_idx],
+            "driver_risearr": col("risearr", is_drv)[d_idx],
+            "driver_fallarr": col("fallarr", is_drv)[d_idx],
+        }
+        for name in ["libcell_id", "fo4_delay", "fix_load_delay"]:
+            driver[name] = self.take_idx(
+                self._cell_df[name].to_numpy(), c_idx, upcast=c_miss
+            )
+        driver_pin_info = pd.DataFrame(driver)
+
+        # Sink pins joined with drivers on net_id
+        s_idx, d_idx = self.left_join_idx(col("net_id", is_snk), driver["net_id"])
+        d_miss = (d_idx < 0).any()
+        keep = d_idx >= 0
+        if driver["driver_x"].dtype.kind == "f":
+            keep[keep] = ~np.isnan(driver["driver_x"][d_idx[keep]])
+        s_idx, d_idx = s_idx[keep], d_idx[keep]
+
+        sink = {}
+        for name in ["id", "x", "y", "cap", "net_id", "cell_id"]:
+            sink[name] = col(name, is_snk)[s_idx]
+        sink["sink_risearr"] = col("risearr", is_snk)[s_idx]
+        sink["sink_fallarr"] = col("fallarr", is_snk)[s_idx]
+        for name in ["driver_pin_id", "driver_x", "driver_y", "driver_id"]:
+            sink[name] = self.take_idx(driver[name], d_idx, upcast=d_miss)
+        sink["driver_risearr"] = self.take_idx(
+            driver["driver_risearr"], d_idx, upcast=d_miss
+        )
+        sink["driver_fallarr"] = self.take_idx(
+            driver["driver_fallarr"], d_idx, upcast=d_miss
+        )
+        for name in ["libcell_id", "fo4_delay", "fix_load_delay"]:
+            sink["driver_" + name] = self.take_idx(driver[name], d_idx, upcast=d_miss)
+        sink["x"] = sink["x"] - sink["driver_x"]
+        sink["y"] = sink["y"] - sink["driver_y"]
+
+        # Context sink locations, grouped by net_id
+        net = sink["net_id"]
+        valid = ~np.isnan(net) if net.dtype.kind == "f" else np.ones(len(net), bool)
+        order, start, _ = coh.get_segments(net[valid])
+        seg = np.full(len(net), -1, dtype=np.int64)
+        seg[np.flatnonzero(valid)[order]] = np.repeat(
+            np.arange(len(start)), np.diff(np.r_[start, len(order)])
+        )
+        upcast = not valid.all()
+        for name in ["x", "y"]:
+            stats = coh.segment_agg(
+                sink[name][valid][order], start, ["mean", "min", "max", "std"]
+            )
+            stats["std"] = np.nan_to_num(stats["std"], nan=0.0)
+            for how in ["mean", "min", "max", "std"]:
+                sink[f"context_{name}_{how}"] = self.take_idx(
+                    stats[how], seg, upcast=upcast
+                )
+        cap_sum = coh.segment_agg(sink["cap"][valid][order], start, ["sum"])["sum"]
+        sink["cap_sum"] = self.take_idx(cap_sum, seg, upcast=upcast)
+
+        sink["sink_arr"] = np.fmin(sink["sink_risearr"], sink["sink_fallarr"])
+        sink["driver_arr"] = np.fmin(sink["driver_risearr"], sink["driver_fallarr"])
+
+        # Cell arc delays per arc target pin
+        tar = pin_pin_df["tar_id"].to_numpy()
+        order, start, tar_keys = coh.get_segments(tar)
+        arc = coh.segment_agg(
+            pin_pin_df["arc_delay"].to_numpy(dtype=float)[order],
+            start,
+            ["mean", "min", "max"],
+        )
+
+        a_idx = self.lookup_idx(tar_keys, sink["driver_pin_id"])
+        keep = a_idx >= 0
+        keep[keep] = ~np.isnan(arc["mean"][a_idx[keep]])
+        sink = {name: values[keep] for name, values in sink.items()}
+        sink["driver_pin_id"] = sink["driver_pin_id"].astype(int)
+        a_idx = a_idx[keep]
+        for how in ["mean", "min", "max"]:
+            sink[f"arc_delay_{how}"] = arc[how][a_idx]
+
+        # Net delay, i.e. the arcs ending at the sink pin
+        n_idx = self.lookup_idx(tar_keys, sink["id"])
+        for how in ["mean", "min", "max"]:
+            sink[f"net_delay_{how}"] = self.take_idx(arc[how], n_idx, upcast=True)
+
+        # Stage delay = driver cell arc delay + net delay
+        sink["stage_delay"] = sink["arc_delay_max"] + sink["net_delay_max"]
+        sink["arc_delay"] = sink["arc_delay_max"]
+        sink["net_delay"] = sink["net_delay_max"]
+
+        sink_pin_info = pd.DataFrame(sink)
+        return driver_pin_info, sink_pin_info
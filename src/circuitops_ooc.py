@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import circuitops_helper as coh
+
+# sort records: 64-bit key + payload, runs and merged outputs are .npy files
+REC = np.dtype([("key", "<u8"), ("val", "<i8")])
+KINDS = {"pin": 0, "cell": 1, "net": 2}
+# per-kind salt of the name hashes, so a pin and a net of the same name differ
+KIND_SALT = np.array([0, 0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F], dtype=np.uint64)
+# vertex tables in id order, see coh.update_vertices
+VERTEX_TABLES = ["pin", "cell", "net"]
+
+
+def hash_names(names, kinds):
+    h = pd.util.hash_array(np.asarray(names, dtype=object))
+    return h ^ KIND_SALT[kinds]
+
+
+def iter_chunks(data_root, fname, chunk_rows, usecols):
+    # rows of a (sharded / compressed) table, chunk_rows at a time
+    paths = coh.find_table(data_root, fname)
+    if not paths:
+        raise FileNotFoundError(os.path.join(data_root, fname))
+    for path in paths:
+        with pd.read_csv(path, usecols=usecols, chunksize=chunk_rows) as reader:
+            yield from reader
+
+
+def sort_records(rec):
+    return rec[np.lexsort((rec["val"], rec["key"]))]
+
+
+def write_run(rec, path):
+    np.save(path, sort_records(rec), allow_pickle=False)
+    return path
+
+
+### k-way merge of sorted runs into one sorted .npy, about 2 * block_rows
+### records in memory. Every round each run is topped up to its share of
+### block_rows and all records up to the smallest buffered run tail are
+### written; records equal to that tail are identical, so order is kept
+def merge_runs(run_paths, out_path, block_rows):
+    runs = [np.load(p, mmap_mode="r") for p in run_paths]
+    total = sum(len(r) for r in runs)
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype=REC, shape=(total,))
+    step = max(block_rows // max(len(runs), 1), 1)
+    pos = [0] * len(runs)
+    bufs = [np.empty(0, dtype=REC) for _ in runs]
+    n_out = 0
+    while n_out < total:
+        for i, run in enumerate(runs):
+            if len(bufs[i]) < step and pos[i] < len(run):
+                more = np.array(run[pos[i] : pos[i] + step - len(bufs[i])])
+                pos[i] += len(more)
+                bufs[i] = np.concatenate([bufs[i], more])
+
+        tails = [b[-1] for i, b in enumerate(bufs) if len(b) and pos[i] < len(runs[i])]
+        if tails:
+            tail = min(tails, key=lambda r: (r["key"], r["val"]))
+        parts = []
+        for i, b in enumerate(bufs):
+            if not tails:
+                n = len(b)
+            else:
+                n = np.searchsorted(b["key"], tail["key"], side="left")
+                same = b["key"][n:] == tail["key"]
+                n += int((same & (b["val"][n:] <= tail["val"])).sum())
+            parts.append(b[:n])
+            bufs[i] = b[n:]
+        block = sort_records(np.concatenate(parts))
+        out[n_out : n_out + len(block)] = block
+        n_out += len(block)
+    out.flush()
+    return out
+
+
+### on-disk name -> vertex id index: name hashes in order (keys.npy) and
+### their vertex ids (ids.npy), contiguous for binary search
+def build_vertex_index(data_root, work_dir, chunk_rows):
+    runs, counts, next_id = [], {}, 0
+    for kind in VERTEX_TABLES:
+        fname = coh.VERTEX_TABLES_OpenROAD[kind]
+        n = 0
+        for chunk in iter_chunks(data_root, fname, chunk_rows, usecols=[0]):
+            rec = np.empty(len(chunk), dtype=REC)
+            rec["key"] = hash_names(chunk.iloc[:, 0], KINDS[kind])
+            rec["val"] = np.arange(next_id, next_id + len(chunk))
+            next_id += len(chunk)
+            n += len(chunk)
+            runs.append(write_run(rec, os.path.join(work_dir, f"v{len(runs)}.npy")))
+        counts[kind] = n
+
+    merged = merge_runs(runs, os.path.join(work_dir, "vertices.npy"), chunk_rows)
+    for p in runs:
+        os.remove(p)
+    keys = np.lib.format.open_memmap(
+        os.path.join(work_dir, "keys.npy"), "w+", np.uint64, (len(merged),)
+    )
+    ids = np.lib.format.open_memmap(
+        os.path.join(work_dir, "ids.npy"), "w+", np.int64, (len(merged),)
+    )
+    for lo in range(0, len(merged), chunk_rows):
+        block = merged[lo : lo + chunk_rows + 1]
+        # unique names per kind, also catches (unlikely) hash collisions
+        if (block["key"][1:] == block["key"][:-1]).any():
+            raise ValueError("Duplicate vertex names (or overlapping shards)")
+        keys[lo : lo + chunk_rows] = block["key"][:chunk_rows]
+        ids[lo : lo + chunk_rows] = block["val"][:chunk_rows]
+    del merged
+    os.remove(os.path.join(work_dir, "vertices.npy"))
+    return (keys, ids), counts
+
+
+def lookup_ids(index, h):
+    keys, ids = index
+    if not len(keys):
+        return np.full(len(h), -1, dtype=np.int64)
+    pos = np.searchsorted(keys, h)
+    pos[pos == len(keys)] = 0
+    return np.where(keys[pos] == h, ids[pos], -1)
+
+
+### out-of-core version of read_tables_OpenROAD -> generate_edge_df_OpenROAD ->
+### get_csr over all edge types: edge tables are streamed in chunks, names
+### resolved against the on-disk vertex index (illegal edges are dropped as in
+### coh.resolve_edge_ids) and spilled to sorted runs, which are merged into a
+### CSR in out_dir: indptr.npy, indices.npy (tar ids), types.npy (edge types)
+def build_csr(data_root, out_dir, chunk_rows=1 << 20, reverse=False):
+    work_dir = os.path.join(out_dir, "tmp")
+    os.makedirs(work_dir, exist_ok=True)
+    index, counts = build_vertex_index(data_root, work_dir, chunk_rows)
+    total_v_cnt = sum(counts.values())
+    if total_v_cnt >= 1 << 32:
+        raise ValueError("At most 2^32 vertices")
+    print(f"Vertex index: {counts}")
+
+    runs, num_edges = [], {}
+    usecols = ["src", "tar"] + coh.TYPE_COLS
+    for e_type, (name, fname) in enumerate(coh.EDGE_TABLES_OpenROAD.items()):
+        n_in = n_out = 0
+        for chunk in iter_chunks(data_root, fname, chunk_rows, usecols):
+            ids = [
+                lookup_ids(
+                    index,
+                    hash_names(chunk[col], chunk[col + "_type"].map(KINDS).to_numpy()),
+                )
+                for col in ("src", "tar")
+            ]
+            src, tar = ids[::-1] if reverse else ids
+            ok = (src >= 0) & (tar >= 0)
+            src, tar = src[ok].astype(np.uint64), tar[ok].astype(np.uint64)
+            rec = np.empty(len(src), dtype=REC)
+            rec["key"] = (src << np.uint64(32)) | tar
+            rec["val"] = e_type
+            n_in += len(chunk)
+            n_out += len(rec)
+            runs.append(write_run(rec, os.path.join(work_dir, f"e{len(runs)}.npy")))
+        num_edges[name] = n_out
+        print(f"{name}: {n_out} edges, {n_in - n_out} dropped")
+
+    edges = merge_runs(runs, os.path.join(work_dir, "edges.npy"), chunk_rows)
+    for p in runs:
+        os.remove(p)
+
+    # counts per src -> indptr, streamed over the merged edges
+    indptr = np.lib.format.open_memmap(
+        os.path.join(out_dir, "indptr.npy"), "w+", np.int64, (total_v_cnt + 1,)
+    )
+    indices = np.lib.format.open_memmap(
+        os.path.join(out_dir, "indices.npy"), "w+", np.int64, (len(edges),)
+    )
+    types = np.lib.format.open_memmap(
+        os.path.join(out_dir, "types.npy"), "w+", np.int8, (len(edges),)
+    )
+    indptr[:] = 0
+    for lo in range(0, len(edges), chunk_rows):
+        block = edges[lo : lo + chunk_rows]
+        src = (block["key"] >> np.uint64(32)).astype(np.int64)
+        indices[lo : lo + len(block)] = block["key"] & np.uint64(0xFFFFFFFF)
+        types[lo : lo + len(block)] = block["val"]
+        u, c = np.unique(src, return_counts=True)
+        indptr[u + 1] += c
+    carry = 0
+    for lo in range(1, total_v_cnt + 1, chunk_rows):
+        block = np.cumsum(indptr[lo : lo + chunk_rows]) + carry
+        indptr[lo : lo + chunk_rows] = block
+        carry = block[-1]
+    for x in (indptr, indices, types):
+        x.flush()
+    del edges, index
+    shutil.rmtree(work_dir)
+
+    meta = {
+        "N_pin": counts["pin"],
+        "N_cell": counts["cell"],
+        "N_net": counts["net"],
+        "num_edges": num_edges,
+        "reverse": reverse,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def load_csr(out_dir, mmap=True):
+    # (meta, indptr, indices, types), memory-mapped read-only by default
+    with open(os.path.join(out_dir, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = [
+        np.load(os.path.join(out_dir, name + ".npy"), mmap_mode="r" if mmap else None)
+        for name in ("indptr", "indices", "types")
+    ]
+    return (meta, *arrays)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the CSR of an IR directory with bounded memory"
+    )
+    parser.add_argument("data_root")
+    parser.add_argument("out_dir")
+    parser.add_argument("--chunk-rows", type=int, default=1 << 20)
+    parser.add_argument("--reverse", action="store_true", help="tar -> src CSR")
+    args = parser.parse_args()
+    build_csr(args.data_root, args.out_dir, args.chunk_rows, args.reverse)
+
+
+if __name__ == "__main__":
+    main()
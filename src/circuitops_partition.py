@@ -0,0 +1,330 @@
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pandas as pd
+
+
+### balanced die tiles: x quantile columns, each split into y quantile rows
+def tile_labels(x, y, n_parts):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_col = int(np.sqrt(n_parts))
+    while n_parts % n_col:
+        n_col -= 1
+    n_row = n_parts // n_col
+
+    def split(values, n):
+        # rank based, so ties and unplaced (NaN) objects still balance
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[np.argsort(values, kind="stable")] = np.arange(len(values))
+        return rank * n // max(len(values), 1)
+
+    col = split(x, n_col)
+    labels = np.empty(len(x), dtype=np.int64)
+    for c in range(n_col):
+        idx = np.flatnonzero(col == c)
+        labels[idx] = c * n_row + split(y[idx], n_row)
+    return labels
+
+
+### label propagation refinement of a partition over (src, tar) edges: objects
+### move to the part most of their neighbors are in while the parts stay within
+### (1 + imbalance) of the average size; half of the objects (by id parity)
+### move per round, so neighbors do not swap back and forth
+def refine_labels(labels, src, tar, n_parts, n_iter=10, imbalance=0.05):
+    labels = np.array(labels, dtype=np.int64)
+    n = len(labels)
+    cap = int(np.ceil(n / n_parts * (1 + imbalance)))
+    u = np.concatenate([src, tar]).astype(np.int64)
+    v = np.concatenate([tar, src]).astype(np.int64)
+    idle = 0
+    for it in range(n_iter):
+        key, cnt = np.unique(u * n_parts + labels[v], return_counts=True)
+        obj, part = key // n_parts, key % n_parts
+        # best part per object: most neighbors, lowest part id on ties
+        order = np.lexsort((part, -cnt, obj))
+        first = order[np.r_[True, obj[order][1:] != obj[order][:-1]]]
+        best_obj, best_part, best_cnt = obj[first], part[first], cnt[first]
+        own_key = best_obj * n_parts + labels[best_obj]
+        pos = np.searchsorted(key, own_key).clip(max=len(key) - 1)
+        gain = best_cnt - np.where(key[pos] == own_key, cnt[pos], 0)
+        move = (gain > 0) & (best_obj % 2 == it % 2)
+        if not move.any():
+            idle += 1
+            if idle == 2:
+                break
+            continue
+        idle = 0
+
+        # highest gain first, every part takes moves up to its capacity
+        cand = np.flatnonzero(move)
+        cand = cand[np.lexsort((best_obj[cand], -gain[cand]))]
+        tgt = best_part[cand]
+        size = np.bincount(labels, minlength=n_parts)
+        by_tgt = np.argsort(tgt, kind="stable")
+        start = np.searchsorted(tgt[by_tgt], np.arange(n_parts))
+        rank = np.empty(len(cand), dtype=np.int64)
+        rank[by_tgt] = np.arange(len(cand)) - start[tgt[by_tgt]]
+        ok = rank < (cap - size)[tgt]
+        labels[best_obj[cand[ok]]] = tgt[ok]
+    return labels
+
+
+def get_cut(labels, src, tar):
+    return int((labels[src] != labels[tar]).sum())
+
+
+### pins / cells / nets of every part, nets owned by the part of their driver
+### pin (lowest pin id wins; nets without a driver go to their lowest pin).
+### Cut nets have pins in several parts; the halo of a part are the pins of
+### other parts on nets that touch it
+class Partition:
+    def __init__(self, n_parts, pin_part, cell_part, pin_net, is_driver, N_net):
+        self.n_parts = n_parts
+        self.N_pin, self.N_cell, self.N_net = len(pin_part), len(cell_part), N_net
+        self.pin_part = np.asarray(pin_part, dtype=np.int64)
+        self.cell_part = np.asarray(cell_part, dtype=np.int64)
+
+        # pin_net: net index per pin (0..N_net-1), -1 if unconnected
+        pin_net = np.asarray(pin_net, dtype=np.int64)
+        connected = np.flatnonzero(pin_net >= 0)
+        self.net_part = np.zeros(N_net, dtype=np.int64)
+        for pins in (connected, connected[np.asarray(is_driver)[connected]]):
+            # later writes win: reversed, so the lowest pin id is kept
+            self.net_part[pin_net[pins[::-1]]] = self.pin_part[pins[::-1]]
+
+        # owner of a pin's row in per-net results: the part of its net
+        self.pin_owner = self.pin_part.copy()
+        self.pin_owner[connected] = self.net_part[pin_net[connected]]
+
+        key = np.unique(pin_net[connected] * n_parts + self.pin_part[connected])
+        net, part = key // n_parts, key % n_parts
+        parts_per_net = np.bincount(net, minlength=N_net)
+        self.is_cut = parts_per_net > 1
+
+        # halo pairs (part, pin): every part touching the net of a pin but
+        # its own
+        net_start = np.searchsorted(net, np.arange(N_net))
+        cnt = parts_per_net[pin_net[connected]]
+        pin_rep = np.repeat(connected, cnt)
+        off = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        halo_part = part[np.repeat(net_start[pin_net[connected]], cnt) + off]
+        keep = halo_part != self.pin_part[pin_rep]
+        order = np.lexsort((pin_rep[keep], halo_part[keep]))
+        self.halo_ids = pin_rep[keep][order]
+        self.halo_ptr = np.searchsorted(halo_part[keep][order], np.arange(n_parts + 1))
+        self.pin_net = pin_net
+
+    def pins(self, p):
+        return np.flatnonzero(self.pin_part == p)
+
+    def cells(self, p):
+        return np.flatnonzero(self.cell_part == p) + self.N_pin
+
+    def nets(self, p):
+        return np.flatnonzero(self.net_part == p) + self.N_pin + self.N_cell
+
+    def halo_pins(self, p):
+        return self.halo_ids[self.halo_ptr[p] : self.halo_ptr[p + 1]]
+
+    def boundary_pins(self, p):
+        pins = self.pins(p)
+        net = self.pin_net[pins]
+        return pins[(net >= 0) & self.is_cut[net.clip(min=0)]]
+
+    def owner(self, ids):
+        # part of vertex ids (pins, cells, nets)
+        ids = np.asarray(ids, dtype=np.int64)
+        part = np.concatenate([self.pin_part, self.cell_part, self.net_part])
+        return part[ids]
+
+    def summary(self):
+        return pd.DataFrame(
+            {
+                "part": np.arange(self.n_parts),
+                "num_pins": np.bincount(self.pin_part, minlength=self.n_parts),
+                "num_cells": np.bincount(self.cell_part, minlength=self.n_parts),
+                "num_nets": np.bincount(self.net_part, minlength=self.n_parts),
+                "num_cut_nets": np.bincount(
+                    self.net_part[self.is_cut], minlength=self.n_parts
+                ),
+                "num_halo_pins": np.diff(self.halo_ptr),
+            }
+        )
+
+
+_worker_state = {}
+
+
+def _init_worker(cls, handle, partition, fn, args):
+    _worker_state["com"] = cls.attach(handle)
+    _worker_state["task"] = (partition, fn, args)
+
+
+def _part_worker(p):
+    partition, fn, args = _worker_state["task"]
+    return fn(_worker_state["com"], partition, p, *args)
+
+
+### fn(com, partition, p, *args) for every part p, over a process pool that
+### attaches to this manager in shared memory (see CircuitOpsManager.share);
+### cached arrays (e.g. get_csr) are shared, so build them first, tasks should
+### avoid the networkx graph, which every worker would decode. Results are in
+### part order; num_workers=0 runs in this process
+def run_partitioned(com, partition, fn, args=(), num_workers=None):
+    if num_workers == 0:
+        return [fn(com, partition, p, *args) for p in range(partition.n_parts)]
+    num_workers = min(num_workers or os.cpu_count() or 1, partition.n_parts)
+    with com.share() as block:
+        with mp.Pool(
+            num_workers,
+            initializer=_init_worker,
+            initargs=(type(com), block.handle, partition, fn, args),
+        ) as pool:
+            return pool.map(_part_worker, range(partition.n_parts))
+
+
+def merge_frames(results, keys):
+    # per-part frames -> one frame in key order, ties in part order
+    df = pd.concat(results, ignore_index=True)
+    return df.sort_values(keys, kind="stable", ignore_index=True)
+
+
+def selected_pins(com, cell_cnt_th):
+    # get_selected_pins without the pin_pin subgraph, from the cached mask
+    pin_df = com.pin_df
+    mask = com.get_selected_mask(cell_cnt_th)
+    return pin_df[mask & (pin_df.is_buf == False) & (pin_df.is_inv == False)]
+
+
+### per-part tasks; rows of a part are those of the nets / seeds / buffer
+### trees it owns, so merged results equal the whole-design ones
+
+
+def driver_sink_task(com, partition, p, pin_pin_df, cell_cnt_th):
+    selected = selected_pins(com, cell_cnt_th)
+    own = partition.pin_owner[selected["id"].to_numpy()] == p
+    return com.get_driver_sink_info_fast(pin_pin_df, selected[own])
+
+
+def cone_task(com, partition, p, ids, direction, e_types, max_depth):
+    seeds = ids[partition.owner(ids) == p]
+    found, depth = com.get_cone(seeds, direction, e_types, max_depth)
+    return pd.DataFrame({"id": found, "depth": depth})
+
+
+def buffer_tree_task(com, partition, p, cell_cnt_th):
+    # generate_buffer_tree for the trees whose start pin is in p, on the CSR
+    # instead of the pin_pin subgraph: one row per write of generate_buffer_tree
+    # (tree_id, net_id, polarity of a pin), in its order within a level
+    pin_df = com.pin_df
+    valid = com.get_selected_mask(cell_cnt_th)
+    is_bi = (pin_df["is_buf"].to_numpy() == True) | (
+        pin_df["is_inv"].to_numpy() == True
+    )
+    flip = pin_df["dir"].to_numpy() == True
+    net_id = pin_df["net_id"].to_numpy()
+    indptr, indices = com.get_csr((0,))
+    src, tar = com.get_edges(0)
+    start_mask = valid[src] & valid[tar] & ~is_bi[src] & is_bi[tar]
+    # tree ids are numbered over all start pins, in id order
+    starts = np.unique(src[start_mask])
+    tree = np.arange(1, len(starts) + 1)
+    own = partition.pin_part[starts] == p
+    starts, tree = starts[own], tree[own]
+
+    rows = [
+        pd.DataFrame(
+            {
+                "id": starts,
+                "tree_id": tree,
+                "net_id": net_id[starts],
+                "polarity": True,
+                "depth": 0,
+            }
+        )
+    ]
+    node, tree, root_net = starts, tree, net_id[starts]
+    pol = np.ones(len(starts), dtype=bool)
+    depth = 0
+    while len(node):
+        start = indptr[node]
+        cnt = indptr[node + 1] - start
+        off = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        nbr = indices[np.repeat(start, cnt) + off]
+        ok = valid[nbr]
+        nbr_tree = np.repeat(tree, cnt)[ok]
+        nbr_net = np.repeat(root_net, cnt)[ok]
+        # children of start pins keep the default polarity
+        nbr_pol = np.repeat(pol ^ flip[node] if depth else pol, cnt)[ok]
+        nbr = nbr[ok]
+        depth += 1
+        rows.append(
+            pd.DataFrame(
+                {
+                    "id": nbr,
+                    "tree_id": nbr_tree,
+                    "net_id": nbr_net,
+                    "polarity": nbr_pol,
+                    "depth": depth,
+                }
+            )
+        )
+        bi = is_bi[nbr]
+        node, tree, root_net, pol = nbr[bi], nbr_tree[bi], nbr_net[bi], nbr_pol[bi]
+    out = pd.concat(rows, ignore_index=True)
+    out["seq"] = np.arange(len(out))
+    return out
+
+
+### whole-design results computed per part and merged
+
+
+def driver_sink_partitioned(
+    com, partition, pin_pin_df, cell_cnt_th=200, num_workers=None
+):
+    com.get_selected_mask(cell_cnt_th)
+    res = run_partitioned(
+        com, partition, driver_sink_task, (pin_pin_df, cell_cnt_th), num_workers
+    )
+    return (
+        merge_frames([r[0] for r in res], ["driver_pin_id"]),
+        merge_frames([r[1] for r in res], ["id"]),
+    )
+
+
+def cone_partitioned(
+    com, partition, ids, direction="in", e_types=(0,), max_depth=None, num_workers=None
+):
+    com.get_csr(e_types, reverse=direction == "in")
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    res = run_partitioned(
+        com, partition, cone_task, (ids, direction, e_types, max_depth), num_workers
+    )
+    df = pd.concat(res, ignore_index=True)
+    return df.groupby("id", as_index=False, sort=True)["depth"].min()
+
+
+def buffer_trees_partitioned(com, partition, cell_cnt_th=200, num_workers=None):
+    # per pin of a buffer tree, what generate_buffer_tree sets as node
+    # attributes: tree_id, net_id (of the start pin, net_id_rm_bt for
+    # is_end pins), polarity, is_start (bt_s) and is_end (bt_e); depth is the
+    # level it was last written at. Pins outside the trees are left out
+    com.get_selected_mask(cell_cnt_th)
+    com.get_csr((0,))
+    res = run_partitioned(com, partition, buffer_tree_task, (cell_cnt_th,), num_workers)
+    df = pd.concat(res, ignore_index=True)
+    is_bi = (com.pin_df["is_buf"].to_numpy() == True) | (
+        com.pin_df["is_inv"].to_numpy() == True
+    )
+    ids = df["id"].to_numpy()
+    starts = ids[df["depth"].to_numpy() == 0]
+    ends = ids[(df["depth"].to_numpy() > 0) & ~is_bi[ids]]
+    # the last write wins, as in generate_buffer_tree: deepest level, then
+    # tree order, then order within the tree
+    df = df.sort_values(["depth", "tree_id", "seq"], kind="stable")
+    df = df.drop_duplicates("id", keep="last").sort_values("id", ignore_index=True)
+    df["is_start"] = df["id"].isin(starts)
+    df["is_end"] = df["id"].isin(ends)
+    return df.drop(columns="seq")
@@ -0,0 +1,170 @@
+import multiprocessing as mp
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+### gather vertex features from pin/cell/net tables, 0 where a column is missing
+def get_vertex_features(com, feature_cols):
+    x = np.zeros((com.total_v_cnt, len(feature_cols)), dtype=np.float32)
+    for df in [com.pin_df, com.cell_df, com.net_df]:
+        ids = df["id"].to_numpy(dtype=np.int64)
+        for j, col in enumerate(feature_cols):
+            if col in df.columns:
+                x[ids, j] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    return x
+
+
+### sample at most `fanout` neighbors for every vertex in `nodes`
+def sample_neighbors(indptr, indices, nodes, fanout, rng):
+    start = indptr[nodes]
+    deg = indptr[nodes + 1] - start
+
+    # small degree: take all neighbors
+    full = deg <= fanout
+    cnt = deg[full]
+    dst_full = np.repeat(nodes[full], cnt)
+    off = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+    src_full = indices[np.repeat(start[full], cnt) + off]
+
+    # large degree: fanout draws, duplicated draws are merged
+    part = ~full
+    n_part = part.sum()
+    dst_part = np.repeat(nodes[part], fanout)
+    off = (rng.random((n_part, fanout)) * deg[part][:, None]).astype(np.int64)
+    src_part = indices[(start[part][:, None] + off).ravel()]
+    pairs = np.unique(np.stack([dst_part, src_part]), axis=1)
+
+    dst = np.concatenate([dst_full, pairs[0]])
+    src = np.concatenate([src_full, pairs[1]])
+    return src, dst
+
+
+### sample a multi-hop subgraph around seeds and pack it into compact arrays
+def sample_subgraph(indptr, indices, x, seeds, fanouts, rng):
+    src_list, dst_list = [], []
+    frontier = seeds
+    for fanout in fanouts:
+        src, dst = sample_neighbors(indptr, indices, frontier, fanout, rng)
+        src_list.append(src)
+        dst_list.append(dst)
+        frontier = pd.unique(src)
+        if len(frontier) == 0:
+            break
+
+    src = np.concatenate(src_list) if src_list else np.zeros(0, dtype=np.int64)
+    dst = np.concatenate(dst_list) if dst_list else np.zeros(0, dtype=np.int64)
+
+    # seeds come first so that x[:batch_size] are the seed features
+    codes, nodes = pd.factorize(np.concatenate([seeds, src, dst]))
+    n_seed, n_e = len(seeds), len(src)
+    edge_index = np.stack([codes[n_seed : n_seed + n_e], codes[n_seed + n_e :]]).astype(
+        np.int64
+    )
+
+    return {
+        "nodes": nodes.astype(np.int64),
+        "edge_index": edge_index,
+        "x": x[nodes],
+        "batch_size": n_seed,
+    }
+
+
+_worker_state = {}
+
+
+def _init_worker(indptr, indices, x, fanouts):
+    _worker_state["indptr"] = indptr
+    _worker_state["indices"] = indices
+    _worker_state["x"] = x
+    _worker_state["fanouts"] = fanouts
+
+
+def _sample_worker(args):
+    seeds, rng_seed = args
+    return sample_subgraph(
+        _worker_state["indptr"],
+        _worker_state["indices"],
+        _worker_state["x"],
+        seeds,
+        _worker_state["fanouts"],
+        np.random.default_rng(rng_seed),
+    )
+
+
+class NeighborSampler:
+    def __init__(
+        self,
+        com,
+        seeds,
+        fanouts,
+        feature_cols,
+        e_types=(0,),
+        direction="in",
+        batch_size=1024,
+        shuffle=True,
+        num_workers=0,
+        prefetch=4,
+        seed=0,
+    ):
+        if direction not in ("in", "out"):
+            raise ValueError("direction must be 'in' or 'out'")
+
+        # seeds can be a selected pin dataframe, e.g. from get_selected_pins
+        if isinstance(seeds, pd.DataFrame):
+            seeds = seeds["id"]
+        self.seeds = np.asarray(seeds, dtype=np.int64)
+        self.fanouts = list(fanouts)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.num_workers = num_workers
+        self.prefetch = max(prefetch, 1)
+        self.seed = seed
+        self.epoch = 0
+
+        # "in": aggregate from fan-in, i.e. walk edges backwards
+        self.indptr, self.indices = com.get_csr(
+            e_types=e_types, reverse=direction == "in"
+        )
+        self.x = get_vertex_features(com, feature_cols)
+
+    def __len__(self):
+        return (len(self.seeds) + self.batch_size - 1) // self.batch_size
+
+    def _tasks(self, epoch):
+        rng = np.random.default_rng((self.seed, epoch))
+        seeds = rng.permutation(self.seeds) if self.shuffle else self.seeds
+        for i in range(len(self)):
+            batch = seeds[i * self.batch_size : (i + 1) * self.batch_size]
+            yield batch, (self.seed, epoch, i)
+
+    def __iter__(self):
+        tasks = self._tasks(self.epoch)
+        self.epoch += 1
+
+        if self.num_workers == 0:
+            for task in tasks:
+                yield sample_subgraph(
+                    self.indptr,
+                    self.indices,
+                    self.x,
+                    task[0],
+                    self.fanouts,
+                    np.random.default_rng(task[1]),
+                )
+            return
+
+        # keep `prefetch` batches per worker in flight, yield in order
+        with mp.Pool(
+            self.num_workers,
+            initializer=_init_worker,
+            initargs=(self.indptr, self.indices, self.x, self.fanouts),
+        ) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_sample_worker, (task,)))
+                if len(pending) >= self.prefetch * self.num_workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
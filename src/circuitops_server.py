@@ -0,0 +1,394 @@
+import argparse
+import contextlib
+import json
+import os
+import struct
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import circuitops_snapshot as cos
+from circuitops_batch import build_manager
+from circuitops_manager import CircuitOpsManager
+
+MAGIC = b"COPS"
+ALIGN = 8
+# upper bounds per request, so one query cannot stall the others
+MAX_IDS = 100_000
+MAX_ROWS = 2_000_000
+
+
+### binary frame: MAGIC, uint32 header size, JSON header (snapshot column
+### metadata + array layout), then the raw column buffers
+def encode_frame(df):
+    arrays = {}
+    meta = cos.frame_to_arrays(df, "c", arrays)
+    layout, chunks, size = {}, [], 0
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        layout[name] = (size, values.dtype.str, values.shape)
+        pad = -values.nbytes % ALIGN
+        chunks.append(values.tobytes() + b"\0" * pad)
+        size += values.nbytes + pad
+    header = json.dumps({"meta": meta, "layout": layout}).encode()
+    header += b" " * (-(len(header) + 8) % ALIGN)
+    return b"".join([MAGIC, struct.pack("<I", len(header)), header] + chunks)
+
+
+def decode_frame(data):
+    if data[:4] != MAGIC:
+        raise ValueError("Not a CircuitOps frame")
+    (n,) = struct.unpack("<I", data[4:8])
+    header = json.loads(data[8 : 8 + n])
+    body = memoryview(data)[8 + n :]
+    arrays = {
+        name: np.frombuffer(
+            body,
+            dtype=dtype,
+            count=int(np.prod(shape, dtype=np.int64)),
+            offset=offset,
+        ).reshape(shape)
+        for name, (offset, dtype, shape) in header["layout"].items()
+    }
+    return cos.frame_from_arrays(header["meta"], "c", arrays)
+
+
+### many readers or one writer
+class RWLock:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._cond:
+            # waiting writers go first, so a stream of reads cannot starve them
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+### one loaded design; queries that build manager state (e.g. get_selected_pins
+### writes pin_df["selected"] and graph attributes) run alone under the write
+### lock, all other queries run concurrently under the read lock
+class Design:
+    def __init__(self, com, pin_pin_df=None):
+        self.com = com
+        self.pin_pin_df = pin_pin_df
+        self.lock = RWLock()
+        self.results = {}
+
+    @classmethod
+    def load(cls, path):
+        # snapshot directory (see save / CircuitOpsManager.save) or IR table
+        # directory
+        if os.path.exists(os.path.join(path, "meta.json")):
+            pin_pin_df = None
+            pin_pin_path = os.path.join(path, "pin_pin")
+            if os.path.exists(os.path.join(pin_pin_path, "meta.json")):
+                meta, arrays = cos.read_snapshot(pin_pin_path)
+                pin_pin_df = cos.frame_from_arrays(meta["frame"], "pin_pin", arrays)
+            return cls(CircuitOpsManager.load(path), pin_pin_df)
+        return cls(*build_manager(path))
+
+    def save(self, path):
+        # manager snapshot, plus pin_pin_df (for driver_sink) in path/pin_pin
+        self.com.save(path)
+        if self.pin_pin_df is not None:
+            arrays = {}
+            meta = {"frame": cos.frame_to_arrays(self.pin_pin_df, "pin_pin", arrays)}
+            cos.write_snapshot(os.path.join(path, "pin_pin"), meta, arrays)
+
+    def cached(self, key, fn):
+        with self.lock.read():
+            if key in self.results:
+                return self.results[key]
+        with self.lock.write():
+            if key not in self.results:
+                self.results[key] = fn()
+            return self.results[key]
+
+
+def _ids(params, name="ids"):
+    if name not in params:
+        raise ValueError(f"Missing parameter: {name}")
+    ids = params[name]
+    if isinstance(ids, str):
+        ids = [int(x) for x in ids.split(",") if x]
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) > MAX_IDS:
+        raise ValueError(f"At most {MAX_IDS} ids per request")
+    return ids
+
+
+def _e_types(params):
+    e_types = params.get("e_types", "0")
+    if isinstance(e_types, str):
+        e_types = [int(x) for x in e_types.split(",") if x]
+    return tuple(sorted(set(e_types)))
+
+
+def _int(params, name, default=None):
+    value = params.get(name, default)
+    return None if value is None else int(value)
+
+
+def query_nodes(design, params):
+    # rows of pin/cell/net tables by vertex id, optionally only some columns
+    com = design.com
+    kind = params.get("kind", "pin")
+    tables = {
+        "pin": (com.pin_df, 0),
+        "cell": (com.cell_df, com.N_pin),
+        "net": (com.net_df, com.N_pin + com.N_cell),
+    }
+    if kind not in tables:
+        raise ValueError("kind must be 'pin', 'cell' or 'net'")
+    df, offset = tables[kind]
+    rows = _ids(params) - offset
+    if len(rows) and (rows.min() < 0 or rows.max() >= len(df)):
+        raise ValueError(f"ids are not {kind} vertex ids")
+    cols = params.get("cols")
+    if isinstance(cols, str):
+        cols = cols.split(",")
+    out = df.iloc[rows]
+    return (out if cols is None else out[cols]).reset_index(drop=True)
+
+
+def query_cone(design, params):
+    ids, depth = design.com.get_cone(
+        _ids(params),
+        direction=params.get("direction", "in"),
+        e_types=_e_types(params),
+        max_depth=_int(params, "max_depth"),
+    )
+    return pd.DataFrame({"id": ids, "depth": depth})
+
+
+def query_subgraph(design, params):
+    # edges among ids, grown by `hops` levels of fan-in and fan-out first
+    com = design.com
+    e_types = _e_types(params)
+    ids = _ids(params)
+    hops = _int(params, "hops", 0)
+    if hops:
+        ids = np.union1d(
+            com.get_cone(ids, "in", e_types, hops)[0],
+            com.get_cone(ids, "out", e_types, hops)[0],
+        )
+    keep = np.zeros(com.total_v_cnt, dtype=bool)
+    keep[ids] = True
+    parts = []
+    for t in e_types:
+        src, tar = com.get_edges(t)
+        mask = keep[src] & keep[tar]
+        parts.append(
+            pd.DataFrame(
+                {"src_id": src[mask], "tar_id": tar[mask], "type": np.int64(t)}
+            )
+        )
+    return pd.concat(parts, ignore_index=True)
+
+
+def query_selected_pins(design, params):
+    th = _int(params, "cell_cnt_th", 200)
+    return design.cached(
+        ("selected_pins", th),
+        lambda: design.com.get_selected_pins(th).reset_index(drop=True),
+    )
+
+
+def query_driver_sink(design, params):
+    # table = "sink" (default) or "driver"
+    if design.pin_pin_df is None:
+        raise ValueError(
+            "driver/sink tables need pin_pin_df: load the design from IR tables "
+            "or from a snapshot written with Design.save"
+        )
+    th = _int(params, "cell_cnt_th", 200)
+
+    def build():
+        selected = design.com.get_selected_pins(th)
+        return design.com.get_driver_sink_info_fast(design.pin_pin_df, selected)
+
+    driver, sink = design.cached(("driver_sink", th), build)
+    return driver if params.get("table", "sink") == "driver" else sink
+
+
+QUERIES = {
+    "nodes": query_nodes,
+    "cone": query_cone,
+    "subgraph": query_subgraph,
+    "selected_pins": query_selected_pins,
+    "driver_sink": query_driver_sink,
+}
+# queries that take the design lock themselves (see Design.cached)
+LOCKING_QUERIES = {"selected_pins", "driver_sink"}
+
+
+class CircuitOpsHandler(BaseHTTPRequestHandler):
+    # GET /designs
+    # GET|POST /<design>/<query>?params, POST params as a JSON object
+    def _reply(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code, msg):
+        self._reply(code, json.dumps({"error": msg}).encode(), "application/json")
+
+    def _handle(self, body_params):
+        url = urllib.parse.urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        params.update(body_params)
+
+        designs = self.server.designs
+        if parts == ["designs"]:
+            info = {
+                name: {
+                    "N_pin": d.com.N_pin,
+                    "N_cell": d.com.N_cell,
+                    "N_net": d.com.N_net,
+                }
+                for name, d in designs.items()
+            }
+            return self._reply(200, json.dumps(info).encode(), "application/json")
+        if len(parts) != 2 or parts[0] not in designs or parts[1] not in QUERIES:
+            return self._error(404, f"Unknown query: {url.path}")
+
+        design, name = designs[parts[0]], parts[1]
+        try:
+            if name in LOCKING_QUERIES:
+                df = QUERIES[name](design, params)
+            else:
+                with design.lock.read():
+                    df = QUERIES[name](design, params)
+        except (ValueError, KeyError, IndexError) as e:
+            return self._error(400, f"{type(e).__name__}: {e}")
+        except Exception as e:
+            return self._error(500, f"{type(e).__name__}: {e}")
+        if len(df) > MAX_ROWS:
+            return self._error(413, f"{len(df)} rows, at most {MAX_ROWS}")
+        self._reply(200, encode_frame(df), "application/octet-stream")
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            return self._error(400, "POST body must be a JSON object")
+        self._handle(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+### designs: {name: Design}, served from one process, one thread per request
+def make_server(designs, host="127.0.0.1", port=8765, verbose=False):
+    server = ThreadingHTTPServer((host, port), CircuitOpsHandler)
+    server.daemon_threads = True
+    server.designs = designs
+    server.verbose = verbose
+    return server
+
+
+class CircuitOpsClient:
+    def __init__(self, url="http://127.0.0.1:8765", timeout=60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _get(self, path, params=None):
+        data = None
+        if params:
+            # ids can be long, so parameters go in a POST body
+            params = {
+                k: v.tolist() if isinstance(v, np.ndarray) else v
+                for k, v in params.items()
+            }
+            data = json.dumps(params).encode()
+        try:
+            with urllib.request.urlopen(
+                self.url + path, data=data, timeout=self.timeout
+            ) as r:
+                return r.read()
+        except urllib.error.HTTPError as e:
+            msg = json.loads(e.read() or b"{}").get("error", e.reason)
+            raise ValueError(f"{path}: {msg}") from None
+
+    def designs(self):
+        return json.loads(self._get("/designs"))
+
+    def query(self, design, name, **params):
+        return decode_frame(self._get(f"/{design}/{name}", params))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve CircuitOps design queries")
+    parser.add_argument(
+        "designs",
+        nargs="+",
+        help="name=path, path is a snapshot directory or an IR table directory",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    designs = {}
+    for spec in args.designs:
+        name, _, path = spec.partition("=")
+        if not path:
+            raise ValueError(f"Expected name=path, got {spec}")
+        print(f"Loading {name} from {path}")
+        designs[name] = Design.load(path)
+        designs[name].com.get_csr((0,))
+        designs[name].com.get_csr((0,), reverse=True)
+
+    server = make_server(designs, args.host, args.port, args.verbose)
+    print(f"Serving {len(designs)} designs on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+ALIGN = 64
+
+
+### all arrays packed into one shared memory block; the handle is a small
+### picklable dict (block name + layout) that workers attach to
+def publish(meta, arrays):
+    layout, size = {}, 0
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        layout[name] = (size, values.dtype.str, values.shape)
+        size += -(-values.nbytes // ALIGN) * ALIGN
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, values in arrays.items():
+        offset, dtype, shape = layout[name]
+        dst = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        dst[...] = values
+    return shm, {"name": shm.name, "meta": meta, "layout": layout}
+
+
+def _open(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # before Python 3.13 every attach is registered with the resource tracker
+    # of the process; pool workers share the publisher's tracker, but a
+    # tracker of their own would unlink the block when the process exits
+    private = getattr(resource_tracker._resource_tracker, "_fd", None) is None
+    shm = shared_memory.SharedMemory(name=name)
+    if private:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def attach(handle):
+    # read-only zero-copy views of the published arrays
+    shm = _open(handle["name"])
+    arrays = {}
+    for name, (offset, dtype, shape) in handle["layout"].items():
+        values = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        values.flags.writeable = False
+        arrays[name] = values
+    return shm, arrays
+
+
+### owner of a published block, unlinks it on close
+class SharedBlock:
+    def __init__(self, meta, arrays):
+        self.shm, self.handle = publish(meta, arrays)
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
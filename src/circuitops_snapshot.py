@@ -0,0 +1,266 @@
+import json
+import os
+import shutil
+import uuid
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FORMAT = "circuitops-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+### columns <-> flat numpy arrays
+### - numpy dtypes are stored as is (memory-mappable on load)
+### - strings are one "\0"-joined utf-8 blob plus a null mask
+### - nullable extension dtypes (Int64, boolean, ...) are values plus a null mask
+### - set-valued graph attributes are CSR (ptr, values)
+def encode_column(values, name, arrays):
+    if isinstance(values, (pd.Series, pd.Index)):
+        is_ext = isinstance(values.dtype, pd.api.extensions.ExtensionDtype)
+        values = values.array if is_ext else values.to_numpy()
+    dtype = getattr(values, "dtype", None)
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        if not hasattr(dtype, "numpy_dtype"):
+            raise ValueError(f"Unsupported column type of {name}: {dtype}")
+        null = np.asarray(pd.isna(values))
+        arrays[name] = values.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+        arrays[name + ".null"] = null
+        return {"kind": "masked", "dtype": str(dtype)}
+
+    values = np.asarray(values)
+    if values.dtype != object:
+        arrays[name] = values
+        return {"kind": "array"}
+
+    # object arrays: python scalars, strings or sets
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    null = np.asarray(pd.isna(values)) if values.ndim == 1 else None
+    if inferred in ("string", "empty"):
+        text = ["" if n else v for v, n in zip(values, null)]
+        if any("\0" in v for v in text):
+            raise ValueError(f"Strings of {name} contain NUL characters")
+        arrays[name] = np.frombuffer("\0".join(text).encode(), dtype=np.uint8)
+        arrays[name + ".null"] = null
+        return {"kind": "str", "len": len(values)}
+    if inferred in ("integer", "floating", "mixed-integer-float", "boolean"):
+        # python scalars, e.g. node attributes set from lists
+        if null is not None and null.any():
+            raise ValueError(
+                f"Unsupported column type of {name}: {inferred} with nulls"
+            )
+        arrays[name] = np.array(values.tolist())
+        return {"kind": "array", "py": True}
+    if all(isinstance(v, (set, frozenset)) for v in values):
+        shared = len(values) > 0 and all(v is values[0] for v in values)
+        sets = values[:1] if shared else values
+        arrays[name + ".ptr"] = np.cumsum([0] + [len(v) for v in sets])
+        arrays[name] = np.array(
+            [x for v in sets for x in sorted(v)], dtype=np.int64
+        ).reshape(-1)
+        return {"kind": "set", "shared": bool(shared), "len": len(values)}
+    raise ValueError(f"Unsupported column type of {name}: {inferred}")
+
+
+def decode_column(meta, name, arrays):
+    kind = meta["kind"]
+    if kind == "array":
+        values = arrays[name]
+        return values.tolist() if meta.get("py") else values
+    if kind == "masked":
+        return pd.array(
+            np.where(arrays[name + ".null"], pd.NA, arrays[name]).tolist(),
+            dtype=meta["dtype"],
+        )
+    if kind == "str":
+        out = np.empty(meta["len"], dtype=object)
+        if meta["len"]:
+            out[:] = bytes(arrays[name]).decode().split("\0")
+        out[arrays[name + ".null"]] = np.nan
+        return out
+    if kind == "set":
+        ptr, flat = arrays[name + ".ptr"], arrays[name].tolist()
+        sets = [set(flat[ptr[i] : ptr[i + 1]]) for i in range(len(ptr) - 1)]
+        return sets * meta["len"] if meta["shared"] else sets
+    raise ValueError(f"Unsupported column kind: {kind}")
+
+
+def frame_to_arrays(df, prefix, arrays):
+    meta = {"columns": [], "index": None, "len": len(df)}
+    for i, col in enumerate(df.columns):
+        try:
+            col_meta = encode_column(df.iloc[:, i], f"{prefix}.{i}", arrays)
+        except ValueError as e:
+            raise ValueError(f"Column {col!r}: {e}") from None
+        meta["columns"].append(dict(col_meta, name=col))
+    if not df.index.equals(pd.RangeIndex(len(df))):
+        meta["index"] = encode_column(df.index, f"{prefix}.index", arrays)
+    return meta
+
+
+def frame_from_arrays(meta, prefix, arrays):
+    # numpy columns are not copied, so memory-mapped arrays stay lazy
+    data = {
+        i: decode_column(col, f"{prefix}.{i}", arrays)
+        for i, col in enumerate(meta["columns"])
+    }
+    index = (
+        pd.RangeIndex(meta["len"])
+        if meta["index"] is None
+        else decode_column(meta["index"], f"{prefix}.index", arrays)
+    )
+    df = pd.DataFrame(data, index=index, copy=False)
+    df.columns = [col["name"] for col in meta["columns"]]
+    return df
+
+
+# scalar graph attributes: numpy scalars by dtype ("<f8"), python scalars by
+# type ("py:int")
+PY_SCALARS = {"py:bool": bool, "py:int": int, "py:float": float}
+SCALAR_TYPES = (np.generic, bool, int, float)
+
+
+def scalar_type(v):
+    return v.dtype.str if isinstance(v, np.generic) else "py:" + type(v).__name__
+
+
+def scalar_dtype(name):
+    return np.dtype(PY_SCALARS.get(name, name))
+
+
+def scalar_class(name):
+    return PY_SCALARS.get(name) or np.dtype(name).type
+
+
+def graph_to_arrays(g, prefix, arrays):
+    nodes = list(g.nodes)
+    arrays[prefix + ".nodes"] = np.asarray(nodes, dtype=np.int64)
+    edges = np.asarray(list(g.edges), dtype=np.int64).reshape(-1, 2)
+    arrays[prefix + ".src"] = edges[:, 0]
+    arrays[prefix + ".tar"] = edges[:, 1]
+
+    meta = {"node_attrs": [], "edge_attrs": []}
+    for kind, items in [
+        ("node", [d for _, d in g.nodes(data=True)]),
+        ("edge", [d for _, _, d in g.edges(data=True)]),
+    ]:
+        keys = {}
+        for d in items:
+            keys.update(dict.fromkeys(d))
+        for j, key in enumerate(keys):
+            name = f"{prefix}.{kind}.{j}"
+            has = np.array([key in d for d in items], dtype=bool)
+            values = np.empty(int(has.sum()), dtype=object)
+            values[:] = [d[key] for d in items if key in d]
+            if len(values) and all(isinstance(v, SCALAR_TYPES) for v in values):
+                # numpy and python scalars, as set from dataframe columns or
+                # literals; the scalar type of every value is kept (e.g. int
+                # pin x and float cell x, or float net_id and int 0)
+                codes, dtypes = pd.factorize(
+                    np.array([scalar_type(v) for v in values], dtype=object)
+                )
+                dtypes = [str(d) for d in dtypes]
+                arrays[name] = np.array(
+                    values.tolist(),
+                    dtype=np.result_type(*[scalar_dtype(d) for d in dtypes]),
+                )
+                attr_meta = {"kind": "array", "np": dtypes}
+                if len(dtypes) > 1:
+                    arrays[name + ".dtype"] = codes.astype(np.uint8)
+            else:
+                attr_meta = encode_column(values, name, arrays)
+            arrays[name + ".has"] = has
+            meta[kind + "_attrs"].append(dict(attr_meta, name=key))
+    return meta
+
+
+def graph_from_arrays(meta, prefix, arrays):
+    nodes = arrays[prefix + ".nodes"].tolist()
+    src = arrays[prefix + ".src"].tolist()
+    tar = arrays[prefix + ".tar"].tolist()
+    node_attrs = [{} for _ in nodes]
+    edge_attrs = [{} for _ in src]
+    for kind, attrs in [("node", node_attrs), ("edge", edge_attrs)]:
+        for j, attr_meta in enumerate(meta[kind + "_attrs"]):
+            name = f"{prefix}.{kind}.{j}"
+            values = decode_column(attr_meta, name, arrays)
+            if attr_meta.get("np"):
+                types = [scalar_class(d) for d in attr_meta["np"]]
+                if len(types) == 1:
+                    values = values.astype(types[0], copy=False).tolist()
+                    values = list(map(types[0], values))
+                else:
+                    codes = arrays[name + ".dtype"].tolist()
+                    values = [types[c](v) for c, v in zip(codes, values.tolist())]
+            key = attr_meta["name"]
+            for i, v in zip(np.flatnonzero(arrays[name + ".has"]).tolist(), values):
+                attrs[i][key] = v
+
+    g = nx.DiGraph()
+    g.add_nodes_from(zip(nodes, node_attrs))
+    g.add_edges_from(zip(src, tar, edge_attrs))
+    return g
+
+
+### versioned directory: meta.json + one .npy per array
+def is_snapshot(path):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        return json.load(f).get("format") == SNAPSHOT_FORMAT
+
+
+def write_snapshot(path, meta, arrays):
+    path = os.path.normpath(path)
+    if os.path.isdir(path) and os.listdir(path) and not is_snapshot(path):
+        raise ValueError(f"Not a snapshot directory, refusing to replace: {path}")
+    # written next to path and swapped in whole, so no .npy of an earlier
+    # snapshot is left behind and readers mapping it keep their files
+    tmp = f"{path}.{uuid.uuid4().hex}"
+    os.makedirs(tmp)
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), values, allow_pickle=False)
+        meta = dict(meta, format=SNAPSHOT_FORMAT, version=SNAPSHOT_VERSION)
+        meta["arrays"] = sorted(arrays)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+    except BaseException:
+        shutil.rmtree(tmp)
+        raise
+    if os.path.isdir(path):
+        old = f"{tmp}.old"
+        os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old)
+    else:
+        os.rename(tmp, path)
+
+
+def read_snapshot(path, mmap=True):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        raise ValueError(f"Not a snapshot directory: {path}")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a snapshot directory: {path}")
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot version {meta.get('version')}, "
+            f"expected {SNAPSHOT_VERSION}"
+        )
+    # plain ndarray views, still backed by the mapping
+    arrays = {
+        name: np.asarray(
+            np.load(
+                os.path.join(path, name + ".npy"),
+                mmap_mode="c" if mmap else None,
+                allow_pickle=False,
+            )
+        )
+        for name in meta["arrays"]
+    }
+    return meta, arrays
@@ -0,0 +1,152 @@
+import numpy as np
+
+
+### uniform grid (bin) index over point locations
+class GridIndex:
+    def __init__(self, x, y, ids=None, bin_size=None, bounds=None):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        ids = np.arange(len(x)) if ids is None else np.asarray(ids)
+
+        # points without a location are left out of the index
+        valid = ~(np.isnan(x) | np.isnan(y))
+        self.n_input = len(x)
+        self.rows = np.flatnonzero(valid)
+        x, y, ids = x[valid], y[valid], ids[valid]
+
+        if bounds is None:
+            bounds = (x.min(), y.min(), x.max(), y.max()) if len(x) else (0, 0, 1, 1)
+        self.bounds = tuple(float(b) for b in bounds)
+        x0, y0, x1, y1 = self.bounds
+        area = max((x1 - x0) * (y1 - y0), 1.0)
+        if bin_size is None:
+            # about 4 points per bin
+            bin_size = np.sqrt(4 * area / max(len(x), 1))
+        self.bin_size = float(max(bin_size, 1e-9))
+        self.nx = int((x1 - x0) // self.bin_size) + 1
+        self.ny = int((y1 - y0) // self.bin_size) + 1
+
+        self.point_bin = self.bin_of(x, y)
+        order = np.argsort(self.point_bin, kind="stable")
+        self.order = order
+        self.x, self.y, self.ids = x[order], y[order], ids[order]
+        self.bin_ptr = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.point_bin, minlength=self.nx * self.ny),
+            out=self.bin_ptr[1:],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def bin_xy(self, x, y):
+        x0, y0, _, _ = self.bounds
+        bx = np.floor((np.asarray(x, dtype=float) - x0) / self.bin_size)
+        by = np.floor((np.asarray(y, dtype=float) - y0) / self.bin_size)
+        bx = np.nan_to_num(bx, nan=0).clip(0, self.nx - 1).astype(np.int64)
+        by = np.nan_to_num(by, nan=0).clip(0, self.ny - 1).astype(np.int64)
+        return bx, by
+
+    def bin_of(self, x, y):
+        bx, by = self.bin_xy(x, y)
+        return by * self.nx + bx
+
+    def _range(self, qx, qy, r):
+        m = len(qx)
+        bx0, by0 = self.bin_xy(qx - r, qy - r)
+        bx1, by1 = self.bin_xy(qx + r, qy + r)
+        nbx = bx1 - bx0 + 1
+        nb = nbx * (by1 - by0 + 1)
+
+        # candidate bins of every query
+        q = np.repeat(np.arange(m), nb)
+        local = np.arange(nb.sum()) - np.repeat(np.cumsum(nb) - nb, nb)
+        b = (by0[q] + local // nbx[q]) * self.nx + bx0[q] + local % nbx[q]
+
+        # candidate points of every query
+        start = self.bin_ptr[b]
+        cnt = self.bin_ptr[b + 1] - start
+        q = np.repeat(q, cnt)
+        pos = np.repeat(start, cnt) + (
+            np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        )
+
+        d = np.hypot(self.x[pos] - qx[q], self.y[pos] - qy[q])
+        keep = d <= r[q]
+        return q[keep], pos[keep], d[keep]
+
+    def query_range(self, qx, qy, r, sort=False, chunk=65536):
+        # all points within distance r of every query point, as CSR:
+        # the hits of query i are ids[ptr[i]:ptr[i + 1]]
+        qx = np.asarray(qx, dtype=float)
+        qy = np.asarray(qy, dtype=float)
+        r = np.broadcast_to(np.asarray(r, dtype=float), qx.shape)
+
+        q_list, pos_list, d_list = [], [], []
+        for i in range(0, len(qx), chunk):
+            q, pos, d = self._range(
+                qx[i : i + chunk], qy[i : i + chunk], r[i : i + chunk]
+            )
+            q_list.append(q + i)
+            pos_list.append(pos)
+            d_list.append(d)
+        q = np.concatenate(q_list) if q_list else np.zeros(0, dtype=np.int64)
+        pos = np.concatenate(pos_list) if pos_list else np.zeros(0, dtype=np.int64)
+        d = np.concatenate(d_list) if d_list else np.zeros(0)
+
+        if sort:
+            order = np.lexsort((d, q))
+            q, pos, d = q[order], pos[order], d[order]
+        ptr = np.zeros(len(qx) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(q, minlength=len(qx)), out=ptr[1:])
+        return ptr, self.ids[pos], d
+
+    def query_knn(self, qx, qy, k):
+        # k nearest points of every query point, padded with -1 / inf
+        qx = np.asarray(qx, dtype=float)
+        qy = np.asarray(qy, dtype=float)
+        m = len(qx)
+        out_ids = np.full((m, k), -1, dtype=self.ids.dtype if len(self) else int)
+        out_d = np.full((m, k), np.inf)
+        if len(self) == 0 or m == 0:
+            return out_ids, out_d
+
+        # the search radius is doubled until k points are inside, or the
+        # radius covers the whole index
+        x0, y0, x1, y1 = self.bounds
+        far = np.max(
+            [np.hypot(qx - cx, qy - cy) for cx in (x0, x1) for cy in (y0, y1)], axis=0
+        )
+        density = len(self) / max((x1 - x0) * (y1 - y0), 1.0)
+        r = np.full(m, max(np.sqrt(k / (np.pi * density)), self.bin_size))
+        todo = np.arange(m)
+        while len(todo):
+            ptr, ids, d = self.query_range(qx[todo], qy[todo], r[todo], sort=True)
+            cnt = np.diff(ptr)
+            done = (cnt >= k) | (r[todo] >= far[todo])
+
+            n_take = np.minimum(cnt[done], k)
+            rows = np.repeat(todo[done], n_take)
+            cols = np.arange(n_take.sum()) - np.repeat(
+                np.cumsum(n_take) - n_take, n_take
+            )
+            src = np.repeat(ptr[:-1][done], n_take) + cols
+            out_ids[rows, cols] = ids[src]
+            out_d[rows, cols] = d[src]
+
+            todo = todo[~done]
+            r[todo] *= 2
+        return out_ids, out_d
+
+    def aggregate(self, values=None):
+        # per-bin sum of values given in input row order, count if None
+        weights = None
+        if values is not None:
+            weights = np.nan_to_num(np.asarray(values, dtype=float)[self.rows])
+        sums = np.bincount(self.point_bin, weights=weights, minlength=self.nx * self.ny)
+        return sums.reshape(self.ny, self.nx)
+
+    def lookup(self, grid, qx, qy):
+        # value of a per-bin grid at every query point
+        bx, by = self.bin_xy(qx, qy)
+        return grid[by, bx]
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import circuitops_snapshot as cos
+
+# layout of stored entries, entries of other versions are misses
+STORE_VERSION = 2
+
+
+### fingerprint of input tables/arrays plus function parameters
+def fingerprint(*inputs, **params):
+    h = hashlib.blake2b(digest_size=20)
+    for x in inputs:
+        if isinstance(x, pd.DataFrame):
+            h.update(repr(list(zip(x.columns, map(str, x.dtypes)))).encode())
+            h.update(pd.util.hash_pandas_object(x, index=False).to_numpy().tobytes())
+        elif isinstance(x, pd.Series):
+            h.update(str(x.dtype).encode())
+            h.update(pd.util.hash_pandas_object(x, index=False).to_numpy().tobytes())
+        elif isinstance(x, np.ndarray):
+            h.update(f"{x.dtype}{x.shape}".encode())
+            h.update(np.ascontiguousarray(x).tobytes())
+        else:
+            h.update(repr(x).encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+### cheap fingerprint of an IR directory from file names, sizes and mtimes
+def fingerprint_dir(data_root, **params):
+    stats = []
+    for name in sorted(os.listdir(data_root)):
+        path = os.path.join(data_root, name)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            stats.append((name, st.st_size, st.st_mtime_ns))
+    return fingerprint(stats, **params)
+
+
+class FeatureStore:
+    def __init__(self, root, max_bytes=8 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._index_file = os.path.join(self.root, "index.json")
+        self._index = self._read_index()
+
+    def _read_index(self):
+        if not os.path.exists(self._index_file):
+            return {}
+        with open(self._index_file) as f:
+            index = json.load(f)
+        # drop entries removed behind our back
+        return {k: v for k, v in index.items() if os.path.isdir(self._path(k))}
+
+    def _write_index(self):
+        tmp = f"{self._index_file}.{uuid.uuid4().hex}"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_file)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    @property
+    def nbytes(self):
+        return sum(v["nbytes"] for v in self._index.values())
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return list(self._index)
+
+    def get(self, key):
+        if key not in self._index:
+            return None
+        path = self._path(key)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        if meta.get("version") != STORE_VERSION:
+            self.remove(key)
+            return None
+
+        items = []
+        for i, item in enumerate(meta["items"]):
+            if item["kind"] == "array":
+                items.append(np.load(os.path.join(path, f"{i}.npy")))
+                continue
+            # frames: circuitops_snapshot column encoding (nulls, strings,
+            # nullable extension dtypes)
+            arrays = {
+                name: np.load(os.path.join(path, name + ".npy"), allow_pickle=False)
+                for name in item["arrays"]
+            }
+            items.append(cos.frame_from_arrays(item["frame"], str(i), arrays))
+
+        self._index[key]["atime"] = time.time()
+        self._write_index()
+        return items[0] if meta["single"] else tuple(items)
+
+    def put(self, key, value):
+        single = not isinstance(value, tuple)
+        values = [value] if single else list(value)
+
+        # write into a temporary dir first, then move it in place
+        tmp = self._path(f".{key}.{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        meta = {"version": STORE_VERSION, "single": single, "items": []}
+        for i, x in enumerate(values):
+            if isinstance(x, np.ndarray):
+                np.save(os.path.join(tmp, f"{i}.npy"), x, allow_pickle=False)
+                meta["items"].append({"kind": "array"})
+            elif isinstance(x, pd.DataFrame):
+                arrays = {}
+                try:
+                    frame = cos.frame_to_arrays(x, str(i), arrays)
+                except ValueError:
+                    shutil.rmtree(tmp)
+                    raise
+                for name, values in arrays.items():
+                    np.save(
+                        os.path.join(tmp, name + ".npy"), values, allow_pickle=False
+                    )
+                meta["items"].append(
+                    {"kind": "frame", "frame": frame, "arrays": sorted(arrays)}
+                )
+            else:
+                shutil.rmtree(tmp)
+                raise ValueError("FeatureStore only stores DataFrames and ndarrays")
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        nbytes = sum(
+            os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp)
+        )
+        if nbytes > self.max_bytes:
+            shutil.rmtree(tmp)
+            print(f"FeatureStore: skip {key}, {nbytes} bytes exceeds the size cap")
+            return
+
+        self.remove(key)
+        os.rename(tmp, self._path(key))
+        self._index[key] = {"nbytes": nbytes, "atime": time.time()}
+        self.evict()
+
+    def remove(self, key):
+        if key in self._index:
+            del self._index[key]
+        if os.path.isdir(self._path(key)):
+            shutil.rmtree(self._path(key))
+        self._write_index()
+
+    def evict(self):
+        # least recently used entries go first
+        total = self.nbytes
+        for key in sorted(self._index, key=lambda k: self._index[k]["atime"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key]["nbytes"]
+            self.remove(key)
+        self._write_index()
+
+    def cached(self, name, inputs, params, fn):
+        # fn(**params) is only run when (name, inputs, params) is not stored yet
+        key = f"{name}-{fingerprint(*inputs, **params)}"
+        value = self.get(key)
+        if value is None:
+            value = fn(**params)
+            self.put(key, value)
+        return value
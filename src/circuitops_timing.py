@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+
+### WNS/TNS/violation counts/slack histograms of endpoints per group
+class TimingSummary:
+    def __init__(self, ids, slack, group, group_names, bins=50, bin_range=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        slack = np.asarray(slack, dtype=float)
+        group = np.asarray(group, dtype=np.int64)
+        self.group_names = np.asarray(group_names)
+        self.n_group = len(self.group_names)
+
+        # endpoints are kept sorted by group, so one group is one slice
+        order = np.argsort(group, kind="stable")
+        self.ids, self.slack, self.group = ids[order], slack[order], group[order]
+        self.group_ptr = np.zeros(self.n_group + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.group, minlength=self.n_group), out=self.group_ptr[1:]
+        )
+        self.pos = pd.Series(np.arange(len(self.ids)), index=self.ids)
+
+        finite = np.isfinite(self.slack)
+        if bin_range is None:
+            bin_range = (
+                (self.slack[finite].min(), self.slack[finite].max())
+                if finite.any()
+                else (0.0, 1.0)
+            )
+        self.bin_edges = np.linspace(bin_range[0], bin_range[1], bins + 1)
+
+        self.tns = np.zeros(self.n_group)
+        self.num_violating = np.zeros(self.n_group, dtype=np.int64)
+        self.hist = np.zeros((self.n_group, bins), dtype=np.int64)
+        self._add(self.group, self.slack, 1)
+        self.wns = np.full(self.n_group, np.inf)
+        np.minimum.at(self.wns, self.group[finite], self.slack[finite])
+
+    def _bin(self, slack):
+        b = np.searchsorted(self.bin_edges, slack, side="right") - 1
+        return b.clip(0, len(self.bin_edges) - 2)
+
+    def _add(self, group, slack, sign):
+        # additive metrics; non-finite slack (unconstrained) is left out
+        finite = np.isfinite(slack)
+        group, slack = group[finite], slack[finite]
+        neg = slack < 0
+        np.add.at(self.tns, group[neg], sign * slack[neg])
+        np.add.at(self.num_violating, group[neg], sign)
+        np.add.at(self.hist, (group, self._bin(slack)), sign)
+
+    def update(self, ids, slack):
+        # only the given endpoints are touched; ids that are not endpoints
+        # are ignored
+        ids = np.asarray(ids, dtype=np.int64)
+        slack = np.asarray(slack, dtype=float)
+        pos = self.pos.reindex(ids).to_numpy()
+        hit = ~np.isnan(pos)
+        pos, slack = pos[hit].astype(np.int64), slack[hit]
+
+        group, old = self.group[pos], self.slack[pos]
+        self._add(group, old, -1)
+        self._add(group, slack, 1)
+        self.slack[pos] = slack
+
+        # WNS can only get worse incrementally; groups that lost their worst
+        # endpoint are rescanned
+        finite = np.isfinite(slack)
+        np.minimum.at(self.wns, group[finite], slack[finite])
+        for g in np.unique(group[old <= self.wns[group]]):
+            s = self.slack[self.group_ptr[g] : self.group_ptr[g + 1]]
+            s = s[np.isfinite(s)]
+            self.wns[g] = s.min() if len(s) else np.inf
+
+    def summary(self):
+        return pd.DataFrame(
+            {
+                "group": self.group_names,
+                "num_endpoints": np.diff(self.group_ptr),
+                "num_violating": self.num_violating,
+                "wns": np.where(np.isinf(self.wns), np.nan, self.wns),
+                "tns": self.tns,
+            }
+        )